@@ -0,0 +1,33 @@
+"""
+Micro-benchmark of the stat page parser: BeautifulSoup tree vs. the streaming table extractor.
+
+Run from the project root:  python -m benchmarks.bench_parser [rows ...]
+"""
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from rush.rankingscraper import parse_entries_from_page
+from rush.synthetic import LAND_STAT, synthetic_round, stat_page
+
+
+def bench(rows: int, repeat: int = 5) -> tuple[float, float]:
+    page = stat_page(LAND_STAT, synthetic_round(players=rows, stats=1)[LAND_STAT])
+    assert parse_entries_from_page(page) == parse_entries_from_page(BeautifulSoup(page, "html.parser"))
+    number = max(1, 2000 // rows)
+    soup_time = min(timeit.repeat(lambda: parse_entries_from_page(BeautifulSoup(page, "html.parser")),
+                                  number=number, repeat=repeat)) / number
+    fast_time = min(timeit.repeat(lambda: parse_entries_from_page(page), number=number, repeat=repeat)) / number
+    return soup_time, fast_time
+
+
+def main(sizes: list[int]):
+    print(f"{'rows':>6} {'soup ms':>10} {'fast ms':>10} {'speedup':>8}")
+    for rows in sizes:
+        soup_time, fast_time = bench(rows)
+        print(f"{rows:>6} {soup_time * 1000:>10.2f} {fast_time * 1000:>10.2f} {soup_time / fast_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 1000])
@@ -0,0 +1,173 @@
+"""
+Benchmark suite of the parser, scaler and scorer on synthetic rounds, see rush.synthetic.
+
+Every stage is timed separately for each round size, and scoring a series of rounds is timed as a whole.
+Nothing touches the network: the synthetic rounds are put straight into the round repository, and scores
+go to a throw-away result store. The timings are written to a JSON file; pass an earlier one with
+--compare to see what got faster or slower.
+
+Run from the project root:  python -m benchmarks.bench_suite [--players 1000 10000 100000] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import rush.rushrankings as rushrankings
+from config import OUT_DIR, v6_config
+from rush.rankingscraper import Ranking, parse_entries_from_page, feature_scaled_scores
+from rush.repository import repository
+from rush.resultstore import ResultStore
+from rush.roundstats import RoundStats
+from rush.rushrankings import is_dom_stat, score_categories, all_player_names, blop_scores_for_round, \
+    multiple_round_scores
+from rush.scaling import scale_round
+from rush.scoringplan import ScoringPlan
+from rush.synthetic import LAND_STAT, synthetic_round, round_configs, stat_page
+
+# The per player scorer is slow, it is timed on this many players of a round
+LEGACY_SCORING_PLAYERS = 1000
+
+
+def best_time(function, repeat: int, setup=None) -> float:
+    """Seconds of the fastest of `repeat` runs. `setup` runs before each of them, untimed."""
+    times = list()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dom_round(pages: dict) -> RoundStats:
+    """The stats of a synthetic round as the scorer loads them: dominion stats only."""
+    return RoundStats.from_rankings({name: rankings for name, rankings in pages.items() if is_dom_stat(name)})
+
+
+class Suite:
+    def __init__(self, repeat: int, store: ResultStore, out_dir: str):
+        self.repeat = repeat
+        self.store = store
+        self.out_dir = out_dir
+        self.results = list()
+
+    def record(self, stage: str, seconds: float, **details):
+        self.results.append(dict(stage=stage, seconds=seconds, **details))
+        size = ', '.join(f'{key} {value}' for key, value in details.items())
+        print(f'{stage:<24} {seconds * 1000:>10.1f} ms   {size}')
+
+    def clear_store(self):
+        shutil.rmtree(self.store.store_dir, ignore_errors=True)
+
+    def bench_round(self, players: int, stats: int):
+        """Time every stage on one round of `players` players."""
+        pages = synthetic_round(players, stats, seed=players)
+
+        page = stat_page(LAND_STAT, pages[LAND_STAT])
+        self.record('parse', best_time(lambda: parse_entries_from_page(page), self.repeat),
+                    players=players, bytes=len(page))
+
+        rankings = {name: Ranking(r.rank, name, r.score) for name, r in pages[LAND_STAT].items()}
+        self.record('feature_scaled_scores',
+                    best_time(lambda: feature_scaled_scores(rankings, method='log'), self.repeat), players=players)
+
+        round_stats = dom_round(pages)
+        plan = ScoringPlan.compile(v6_config)
+        self.record('scale_round', best_time(lambda: scale_round(round_stats, plan.scaling_methods), self.repeat),
+                    players=players, stats=len(round_stats))
+
+        sample = all_player_names(round_stats)[:LEGACY_SCORING_PLAYERS]
+        self.record('score_categories',
+                    best_time(lambda: [score_categories(v6_config, round_stats, name) for name in sample], self.repeat),
+                    players=players, players_timed=len(sample), stats=len(round_stats))
+
+        round_number = 2000 + players
+        repository.put(round_stats, round_number, is_dom_stat, plan.scaling_methods)
+        self.record('blop_scores_for_round',
+                    best_time(lambda: blop_scores_for_round(v6_config, round_number), self.repeat, self.clear_store),
+                    players=players, stats=len(round_stats))
+        repository.clear(round_number)
+
+    def bench_rounds(self, rounds: int, players: int, stats: int):
+        """Time a multi-round report over `rounds` rounds, scored in this process."""
+        configs = round_configs(rounds)
+        for round_number, config in configs.items():
+            round_stats = dom_round(synthetic_round(players, stats, seed=round_number))
+            methods = ScoringPlan.compile(config).scaling_methods
+            scale_round(round_stats, methods)
+            repository.put(round_stats, round_number, is_dom_stat, methods)
+        round_numbers = list(configs)
+        self.record('multiple_round_scores',
+                    best_time(lambda: multiple_round_scores(configs, round_numbers, self.out_dir, workers=1),
+                              self.repeat, self.clear_store),
+                    rounds=rounds, players=players, stats=stats)
+        for round_number in round_numbers:
+            repository.clear(round_number)
+
+
+def compare(results: list[dict], baseline_file: str):
+    """Print the change of every stage against an earlier results file."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    key = lambda r: (r['stage'], r.get('players'), r.get('rounds'))
+    before = {key(r): r['seconds'] for r in baseline['results']}
+    print(f"\nSpeedup compared to {baseline.get('commit')} ({baseline_file}):")
+    for r in results:
+        if key(r) in before:
+            print(f"{r['stage']:<24} {r.get('players', ''):>7} {before[key(r)] / r['seconds']:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the parser, scaler and scorer on synthetic rounds.')
+    parser.add_argument('--players', type=int, nargs='+', default=[1000, 10000, 100000], help='Round sizes')
+    parser.add_argument('--stats', type=int, default=64, help='Stats per round')
+    parser.add_argument('--rounds', type=int, default=50, help='Rounds of the multi-round report')
+    parser.add_argument('--round-players', type=int, default=2000, help='Players per round of the multi-round report')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the fastest counts')
+    parser.add_argument('--out', help='Results file, by default in the output directory')
+    parser.add_argument('--compare', help='Earlier results file to compare with')
+    args = parser.parse_args()
+
+    # Synthetic rounds can't be loaded again once evicted, so all of them have to fit
+    repository.max_rounds = max(repository.max_rounds, args.rounds + 1)
+    repository.max_bytes = float('inf')
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        rushrankings.result_store = ResultStore(f'{work_dir}/results')
+        suite = Suite(args.repeat, rushrankings.result_store, work_dir)
+        for players in args.players:
+            suite.bench_round(players, args.stats)
+        suite.bench_rounds(args.rounds, args.round_players, args.stats)
+
+    commit = current_commit()
+    out = args.out or f'{OUT_DIR}/benchmark-{commit or "unknown"}.json'
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(dict(commit=commit, date=datetime.now().isoformat(timespec='seconds'),
+                       python=platform.python_version(), numpy=np.__version__, machine=platform.machine(),
+                       arguments=vars(args), results=suite.results), f, indent=2)
+    print('Results written to', out)
+
+    if args.compare:
+        compare(suite.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,62 +1,241 @@
+import hashlib
 import json
+import os
+import re
+from collections.abc import Mapping
 
 OUT_DIR = './out'
 CACHE_DIR = './cache'
-OD_BASE = 'https://www.opendominion.net'
+# Point OD_BASE at a local stand-in server (python -m rush.standin) to work offline
+OD_BASE = os.environ.get('OD_BASE', 'https://www.opendominion.net')
 VALHALLA_URL = f'{OD_BASE}/valhalla/round'
 
+# HTTP transport: 'live', 'record' (also archive every response) or 'replay' (only from the archive)
+TRANSPORT_MODE = os.environ.get('RUSH_TRANSPORT', 'live')
+HTTP_ARCHIVE_DIR = f'{CACHE_DIR}/http'
+# Keep the raw HTML of every page the round cache downloads, to parse it again later (python -m rush.reparse)
+ARCHIVE_PAGES = True
+
+# Fetching of the Valhalla pages
+FETCH_CONCURRENCY = 8       # Maximum number of requests in flight
+FETCH_MIN_INTERVAL = 0.05   # Minimum number of seconds between two requests to the same host
+FETCH_RETRIES = 3           # Retries on connection errors and 429/5xx responses
+FETCH_BACKOFF = 0.5         # Seconds before the first retry, doubled on every next one
+FETCH_TIMEOUT = 30          # Seconds
+
+# Loaded rounds kept in memory by the round repository
+REPOSITORY_MAX_ROUNDS = 64
+REPOSITORY_MAX_BYTES = 512 * 1024 * 1024
+
+# Worker processes for scoring multiple rounds, 1 to score them one after another in this process.
+# Every worker fetches with its own session and rate limiter.
+SCORING_WORKERS = 4
+
+# Reports of the report pipeline (python -m rush.pipeline) built at the same time
+PIPELINE_WORKERS = 4
+
+# Renamed players: {old name: current name}. Their scores are combined under the current name.
+PLAYER_ALIASES: dict[str, str] = {}
+
+# Players on each leaderboard of a round: the total and every category
+LEADERBOARD_SIZE = 10
+
+# Seconds between two polls of a live round in watch mode
+WATCH_INTERVAL = 300
+
+# Leaderboard service (python -m rush.service): port, and seconds between two checks for changed rounds or configs
+SERVICE_PORT = 8080
+SERVICE_REFRESH_INTERVAL = 60
+
+# Seconds the reports may take to import, checked by python main.py check-imports. About 0.11 now, the
+# rest is headroom for slower machines.
+IMPORT_TIME_BUDGET = 0.5
+
+
+SCORING_CONFIG_FILE = 'rush/rush_rankings_{version}.json'
+
+# Scoring config version of every round: {round id: version}
+ROUND_CONFIG_VERSIONS = {
+    69: 'v6', # Round 46
+    67: 'v5', # Round 45
+    66: 'v4', # Round 44
+    64: 'v4', # Round 43
+    63: 'v4', # Round 42
+    61: 'v4', # Round 41
+    60: 'v4',
+    58: 'v4',
+    56: 'v3',
+    54: 'v2',
+    52: 'v2',
+    51: 'v1',
+    49: 'v1',
+    48: 'v1',
+    47: 'v1',
+    45: 'v1',
+    44: 'v1',
+    42: 'v1',
+    41: 'v1',
+    39: 'v1',
+    38: 'v1',
+    36: 'v1',
+    35: 'v1',
+    33: 'v1',
+    30: 'v1',
+    28: 'v1',
+    26: 'v1'
+}
+
 
 def load_scoring_config(filename: str):
     with open(filename) as f:
         return json.load(f)
 
 
-v1_config = load_scoring_config('rush/rush_rankings_v1.json')
-v2_config = load_scoring_config('rush/rush_rankings_v2.json')
-v3_config = load_scoring_config('rush/rush_rankings_v3.json')
-v4_config = load_scoring_config('rush/rush_rankings_v4.json')
-v5_config = load_scoring_config('rush/rush_rankings_v5.json')
-v6_config = load_scoring_config('rush/rush_rankings_v6.json')
-
-ALL_BLOP_ROUNDS = {
-    69: v6_config, # Round 46
-    67: v5_config, # Round 45
-    66: v4_config, # Round 44
-    64: v4_config, # Round 43
-    63: v4_config, # Round 42
-    61: v4_config, # Round 41
-    60: v4_config,
-    58: v4_config,
-    56: v3_config,
-    54: v2_config,
-    52: v2_config,
-    51: v1_config,
-    49: v1_config,
-    48: v1_config,
-    47: v1_config,
-    45: v1_config,
-    44: v1_config,
-    42: v1_config,
-    41: v1_config,
-    39: v1_config,
-    38: v1_config,
-    36: v1_config,
-    35: v1_config,
-    33: v1_config,
-    30: v1_config,
-    28: v1_config,
-    26: v1_config
-}
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_scoring_config(config: dict, source: str = 'scoring config'):
+    """Raise a ValueError for anything the scorer can't use."""
+    if not isinstance(config, dict) or not config:
+        raise ValueError(f'{source}: expected an object with score categories')
+    for name, category in config.items():
+        if not isinstance(category, dict):
+            raise ValueError(f'{source}: category {name!r} is not an object')
+        rankings = category.get('rankings')
+        if not rankings or not isinstance(rankings, list) or not all(isinstance(r, str) for r in rankings):
+            raise ValueError(f'{source}: category {name!r} needs a list of rankings')
+        calculation = category.get('calculation')
+        if calculation != 'average' and not re.fullmatch(r'average of best \d+', str(calculation)):
+            raise ValueError(f'{source}: category {name!r} has unknown calculation {calculation!r}')
+        if not is_number(category.get('weight')):
+            raise ValueError(f'{source}: category {name!r} needs a numeric weight')
+        for key in ('small_land_max_penalty', 'small_land_penalty_threshold'):
+            if category.get(key) is not None and not is_number(category[key]):
+                raise ValueError(f'{source}: category {name!r} has a {key} that is not a number')
+        if not isinstance(category.get('scaling_style', ''), str):
+            raise ValueError(f'{source}: category {name!r} has a scaling_style that is not a name')
+
+
+def scoring_config_hash(config: dict) -> str:
+    """Stable hash of a scoring config, independent of key order."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class ScoringConfigs(Mapping):
+    """Scoring configs by version, loaded and validated on first use. Treat the configs as read-only."""
+
+    def __init__(self, file_pattern: str = SCORING_CONFIG_FILE):
+        self.file_pattern = file_pattern
+        self._configs = dict()
+        self._hashes = dict()   # id of a loaded config: its hash
+        self._mtimes = dict()
 
-ALL_ROUNDS: list[int] = sorted(ALL_BLOP_ROUNDS.keys(), reverse=True)
+    def _load(self, version: str) -> dict:
+        file_name = self.file_pattern.format(version=version)
+        mtime = os.path.getmtime(file_name)
+        config = load_scoring_config(file_name)
+        validate_scoring_config(config, file_name)
+        old = self._configs.get(version)
+        if old is not None:
+            del self._hashes[id(old)]
+        self._configs[version] = config
+        self._hashes[id(config)] = scoring_config_hash(config)
+        self._mtimes[version] = mtime
+        return config
+
+    def __getitem__(self, version: str) -> dict:
+        if version not in self._configs:
+            try:
+                return self._load(version)
+            except FileNotFoundError:
+                raise KeyError(version) from None
+        return self._configs[version]
+
+    def __iter__(self):
+        return iter(sorted(set(ROUND_CONFIG_VERSIONS.values()) | set(self._configs)))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def hash(self, config: dict | str) -> str:
+        """Content hash of a version, or of a config. Computed once for the loaded versions."""
+        if isinstance(config, str):
+            config = self[config]
+        return self._hashes.get(id(config)) or scoring_config_hash(config)
+
+    def refresh(self) -> list[str]:
+        """Load the loaded versions again if their file changed. Returns the versions whose content changed."""
+        changed = list()
+        for version, config in list(self._configs.items()):
+            file_name = self.file_pattern.format(version=version)
+            try:
+                if os.path.getmtime(file_name) == self._mtimes[version]:
+                    continue
+                old_hash = self.hash(config)
+                if self.hash(self._load(version)) != old_hash:
+                    changed.append(version)
+            except (OSError, ValueError) as e:
+                print(f'Warning: keeping scoring config {version}, {file_name} could not be loaded: {e}')
+        return changed
+
+
+class RoundConfigs(Mapping):
+    """{round id: scoring config}, loading a version only when one of its rounds is asked for."""
+
+    def __init__(self, versions: dict[int, str], configs: ScoringConfigs):
+        self.versions = versions
+        self.configs = configs
+
+    def __getitem__(self, round_id: int) -> dict:
+        return self.configs[self.versions[round_id]]
+
+    def __iter__(self):
+        return iter(self.versions)
+
+    def __len__(self) -> int:
+        return len(self.versions)
+
+
+scoring_configs = ScoringConfigs()
+ALL_BLOP_ROUNDS = RoundConfigs(ROUND_CONFIG_VERSIONS, scoring_configs)
+
+ALL_ROUNDS: list[int] = sorted(ROUND_CONFIG_VERSIONS, reverse=True)
 LAST_ROUND = ALL_ROUNDS[0]
 LAST_FIVE_ROUNDS = ALL_ROUNDS[:5]
 LAST_TEN_ROUNDS = ALL_ROUNDS[:10]
 BETA_ROUNDS = (24, 22, 20, 19)
 
+# Rounds still in progress. Their cached pages are revalidated on every load, all other rounds
+# are served from the cache without any network traffic once they have been downloaded.
+LIVE_ROUNDS: tuple[int, ...] = ()
+
+
+# Rounds are numbered on from the beta rounds, oldest first
+ROUND_NUMBERS: dict[int, int] = {round_id: 20 + i for i, round_id in enumerate(reversed(ALL_ROUNDS))}
+ROUND_IDS: dict[int, int] = {number: round_id for round_id, number in ROUND_NUMBERS.items()}
+
 
 def round_number_of_round_id(round_id: int) -> int:
-    return 20 + ALL_ROUNDS[::-1].index(round_id)
+    if round_id not in ROUND_NUMBERS:
+        raise ValueError(f'Unknown round id {round_id}')
+    return ROUND_NUMBERS[round_id]
+
+
+def round_id_of_round_number(round_number: int) -> int:
+    if round_number not in ROUND_IDS:
+        raise ValueError(f'Unknown round number {round_number}')
+    return ROUND_IDS[round_number]
+
+
+def __getattr__(name: str):
+    # v1_config ... v6_config, loaded on first use
+    if match := re.fullmatch(r'(v\d+)_config', name):
+        try:
+            return scoring_configs[match.group(1)]
+        except KeyError:
+            pass
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 if __name__ == '__main__':
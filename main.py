@@ -1,27 +1,160 @@
 """
 Scoring system to calculate the Rush Rankings.
 
+    python main.py                  The last round, the last ten rounds and lifetime, as always
+    python main.py round [ROUND]    Detailed scores of a round, by default the last one
+    python main.py last [N]         Scores of the last N rounds, by default ten
+    python main.py lifetime         Scores of all rounds
+    python main.py dave             Dave scores of all rounds
+    python main.py titles [ROUNDS]  Title holders, by default of the last round
+    python main.py top100 [ROUNDS]  Top 100 wiki pages, by default of the last round
+    python main.py reparse [ROUNDS] Parse the archived pages of rounds again, without fetching
+    python main.py check-imports    Check the import time of the reports against IMPORT_TIME_BUDGET
+
+Every report is only imported when it runs. Reports of rounds that are in the round cache don't
+import the network and HTML parsing libraries at all: the fetcher loads them on its first request.
+
 Author: Serge Beaumont
 """
+import argparse
+import subprocess
+import sys
+from datetime import datetime
+
+from rush import profiling
+from config import OUT_DIR, CACHE_DIR, SCORING_WORKERS, ALL_BLOP_ROUNDS, ALL_ROUNDS, LAST_TEN_ROUNDS, LAST_ROUND, IMPORT_TIME_BUDGET
 
-from rush.rushrankings import round_scores, multiple_round_scores
-from config import OUT_DIR, ALL_BLOP_ROUNDS, ALL_ROUNDS, LAST_TEN_ROUNDS, LAST_ROUND
+# Imported by reports that are served from the round cache, and the modules those must not import
+REPORT_MODULES = ('rush.rushrankings', 'rush.daverankings', 'rush.titleholders', 'tophundred')
+NETWORK_MODULES = ('requests', 'bs4')
 
 
 def single_round(round_number: int):
+    from rush.rushrankings import round_scores
     round_scores(ALL_BLOP_ROUNDS[round_number], round_number, OUT_DIR, with_categories=True)
 
 
+def last_rounds(round_numbers: list[int]):
+    from rush.rushrankings import multiple_round_scores
+    multiple_round_scores(ALL_BLOP_ROUNDS, round_numbers, OUT_DIR)
+
+
 def main():
     print(f"Detailed scores for round {LAST_ROUND}")
     single_round(LAST_ROUND)
 
     print("\nSeparate scores for last ten rounds")
-    multiple_round_scores(ALL_BLOP_ROUNDS, LAST_TEN_ROUNDS, OUT_DIR)
+    last_rounds(LAST_TEN_ROUNDS)
 
     print("\nLifetime scores")
-    multiple_round_scores(ALL_BLOP_ROUNDS, ALL_ROUNDS, OUT_DIR)
+    last_rounds(ALL_ROUNDS)
+
+
+def dave():
+    from rush.daverankings import write_dave_scores
+    write_dave_scores(ALL_ROUNDS)
+
+
+def titles(round_numbers: list[int]):
+    from rush.titleholders import round_title_holders
+    for file_name in round_title_holders(round_numbers):
+        print('Written', file_name)
+
+
+def top100(round_numbers: list[int]):
+    from tophundred import write_top_hundreds
+    pages = write_top_hundreds(round_numbers)
+    print(f'{len(pages)} Top 100 pages written to {OUT_DIR}')
+
+
+def reparse(round_numbers: list[int], workers: int):
+    from rush.pagearchive import archived_rounds
+    from rush.reparse import reparse_rounds
+    parsed = reparse_rounds(round_numbers or archived_rounds(f'{CACHE_DIR}/pages'), workers=workers)
+    print(f'{sum(parsed.values())} pages of {len(parsed)} rounds parsed again')
+
+
+def import_time(modules=REPORT_MODULES) -> tuple[float, list[str]]:
+    """Seconds to import the modules in a new interpreter, and the network modules that came along."""
+    code = (f'import sys, time\nstart = time.perf_counter()\nimport {", ".join(modules)}\n'
+            f'print(time.perf_counter() - start)\nprint(",".join(m for m in {NETWORK_MODULES!r} if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    seconds, loaded = result.stdout.splitlines()[-2:]
+    return float(seconds), [module for module in loaded.split(',') if module]
+
+
+def check_imports(budget: float, runs: int = 5) -> bool:
+    """
+    Whether the reports import within the budget, without the network modules. The first run only warms
+    up the file system cache and the bytecode, of the others the best counts.
+    """
+    import_time()
+    timings = [import_time() for _ in range(runs)]
+    seconds = min(seconds for seconds, loaded in timings)
+    loaded = sorted({module for seconds, loaded_modules in timings for module in loaded_modules})
+    print(f'Importing the reports takes {seconds * 1000:.0f} ms, the budget is {budget * 1000:.0f} ms')
+    if loaded:
+        print(f'Imported without fetching anything: {", ".join(loaded)}')
+    return seconds <= budget and not loaded
+
+
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a number of rounds, it must be at least 1')
+    return n
+
+
+def round_list(rounds: list[int], all_rounds: bool) -> list[int]:
+    return ALL_ROUNDS if all_rounds else rounds or [LAST_ROUND]
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Calculate the Rush Rankings.')
+    parser.add_argument('--profile', nargs='?', metavar='FILE',
+                        const=f'{OUT_DIR}/profile-{datetime.now():%Y%m%d-%H%M%S}.json',
+                        help='Write the time, bytes, pages and memory per stage of the run to a JSON file')
+    commands = parser.add_subparsers(dest='command')
+    command = commands.add_parser('round', help='Detailed scores of a round')
+    command.add_argument('round', type=int, nargs='?', default=LAST_ROUND)
+    command = commands.add_parser('last', help='Scores of the last N rounds')
+    command.add_argument('n', type=positive_int, nargs='?', default=len(LAST_TEN_ROUNDS))
+    commands.add_parser('lifetime', help='Scores of all rounds')
+    commands.add_parser('dave', help='Dave scores of all rounds')
+    for name, help_text in (('titles', 'Title holders of rounds'), ('top100', 'Top 100 wiki pages of rounds')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('rounds', type=int, nargs='*', help='By default the last round')
+        command.add_argument('--all', action='store_true', help='All rounds')
+    command = commands.add_parser('reparse', help='Parse the archived pages of rounds again')
+    command.add_argument('rounds', type=int, nargs='*', help='By default every archived round')
+    command.add_argument('--workers', type=int, default=SCORING_WORKERS)
+    command = commands.add_parser('check-imports', help='Check the import time of the reports')
+    command.add_argument('--budget', type=float, default=IMPORT_TIME_BUDGET, help='Seconds')
+    args = parser.parse_args()
+
+    if args.command == 'check-imports':
+        sys.exit(0 if check_imports(args.budget) else 1)
+    if args.profile:
+        profiling.enable()
+    if args.command == 'round':
+        single_round(args.round)
+    elif args.command == 'last':
+        last_rounds(ALL_ROUNDS[:args.n])
+    elif args.command == 'lifetime':
+        last_rounds(ALL_ROUNDS)
+    elif args.command == 'dave':
+        dave()
+    elif args.command == 'titles':
+        titles(round_list(args.rounds, args.all))
+    elif args.command == 'top100':
+        top100(round_list(args.rounds, args.all))
+    elif args.command == 'reparse':
+        reparse(args.rounds, args.workers)
+    else:
+        main()
+
+    from rush.roundcache import run_counters
+    print(f"\nPage cache: {run_counters}")
+    if args.profile:
+        from dataclasses import asdict
+        profiling.write_report(args.profile, cache=asdict(run_counters))
@@ -1,26 +1,14 @@
-from rush.rankingscraper import load_stats
-from config import ALL_ROUNDS, OUT_DIR, CACHE_DIR
-from pprint import pprint
-import os
-import pickle
-from collections import defaultdict
+from config import ALL_ROUNDS, OUT_DIR
 
+import numpy as np
+
+from rush.players import ScoreMatrix
+from rush.repository import repository
 from rush.rushrankings import all_player_names
 
 
 def load_round_stats(round_number: int) -> dict | None:
-    cache_file_name = f'{CACHE_DIR}/round_{round_number}_all.pickle'
-
-    if os.path.exists(cache_file_name):
-        print('Loading cached file', cache_file_name)
-        with open(cache_file_name, 'rb') as f:
-            stats = pickle.load(f)
-    else:
-        stats = load_stats(round_number, use_cache=False)
-        with open(cache_file_name, 'wb') as f:
-            pickle.dump(stats, f)
-
-    return stats
+    return repository.stats(round_number)
 
 def dave_score_for_player(stats: dict, name: str) -> float:
     score = 0
@@ -38,20 +26,23 @@ def dave_scores_for_round(stats: dict) -> list[list]:
         result.append([name, score])
     return result
 
-if __name__ == '__main__':
+def write_dave_scores(round_numbers: list[int], out_dir: str = OUT_DIR):
+    """Dave scores of every round, and their totals over all of them."""
     all_round_scores = list()
-    for round in ALL_ROUNDS:
+    for round in round_numbers:
         stats = load_round_stats(round)
-        with open(f'{OUT_DIR}/dave_scores_round_{round}.txt', 'w') as f:
+        with open(f'{out_dir}/dave_scores_round_{round}.txt', 'w') as f:
             dave_scores_round = dave_scores_for_round(stats)
             all_round_scores.append(dave_scores_round)
             f.writelines([f'{name}, {score}\n' for name, score in dave_scores_round])
 
-    total_score = defaultdict(int)
-    for stats in all_round_scores:
-        for name, score in stats:
-            total_score[name] += score
+    matrix = ScoreMatrix.from_rounds(dict(zip(round_numbers, all_round_scores)), dtype=np.int64)
+    totals = matrix.totals()
+    names = matrix.names()
+    with open(f'{out_dir}/dave_scores_all_rounds.txt', 'w') as f:
+        for row in np.argsort(-totals, kind='stable').tolist():
+            f.write(names[row] + ', ' + str(totals[row]) + '\n')
+
 
-    with open(f'{OUT_DIR}/dave_scores_all_rounds.txt', 'w') as f:
-        for name, score in sorted(total_score.items(), key=lambda item: item[1], reverse=True):
-            f.write(name + ', ' + str(score) + '\n')
+if __name__ == '__main__':
+    write_dave_scores(ALL_ROUNDS)
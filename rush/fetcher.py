@@ -0,0 +1,134 @@
+"""
+Pooled, concurrent fetching of the Valhalla pages.
+
+All requests go through a single keep-alive session. The number of requests in flight is
+capped over all threads that use the fetcher, requests to the same host are spaced out by a minimum
+interval, and connection errors or 429/5xx responses are retried with exponential backoff. Responses
+can be recorded and replayed, see rush.transport. The session is made on the first request, so
+requests is only imported by runs that actually fetch something.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from config import FETCH_CONCURRENCY, FETCH_MIN_INTERVAL, FETCH_RETRIES, FETCH_BACKOFF, FETCH_TIMEOUT, TRANSPORT_MODE
+from rush.profiling import stage, count
+
+if TYPE_CHECKING:
+    import requests
+    from rush.transport import Transport
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class HostRateLimiter:
+    """Hands out request slots per host, at least `min_interval` seconds apart."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = dict()
+
+    def wait(self, host: str):
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Fetcher:
+    """Keep-alive HTTP session with bounded concurrency, rate limiting and retries."""
+
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, min_interval: float = FETCH_MIN_INTERVAL,
+                 retries: int = FETCH_RETRIES, backoff: float = FETCH_BACKOFF, timeout: float = FETCH_TIMEOUT,
+                 mode: str = TRANSPORT_MODE):
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(min_interval)
+        # Shared by every fetch_all and thread, so the connection pool of the session is never exceeded
+        self._in_flight = threading.BoundedSemaphore(self.concurrency)
+        self.mode = mode
+        self._transport = None
+        self._transport_lock = threading.Lock()
+
+    @property
+    def transport(self) -> 'Transport':
+        """The keep-alive session and the transport on top of it, made on first use."""
+        with self._transport_lock:
+            if self._transport is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from rush.transport import Transport
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._transport = Transport(session, self.mode)
+            return self._transport
+
+    def fetch(self, url: str, headers: dict = None) -> 'requests.Response | None':
+        """GET a single URL. Returns the last response, or None if the host could not be reached."""
+        transport = self.transport
+        import requests     # Imported by the transport by now
+        host = urlsplit(url).netloc
+        response = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            with stage('fetch.rate_limit'):
+                self.limiter.wait(host)
+            try:
+                with self._in_flight, stage('fetch'):
+                    response = transport.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f'Warning: {url} failed ({e.__class__.__name__}), attempt {attempt + 1}')
+                count('requests_failed')
+                continue
+            count('requests')
+            count('bytes_fetched', len(response.content))
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+            print(f'Warning: {url} returned {response.status_code}, attempt {attempt + 1}')
+        return response
+
+    def fetch_all(self, urls: dict[str, str], headers: dict[str, dict] = None) -> dict[str, 'requests.Response | None']:
+        """GET a dict of {name: url} concurrently. The result keeps the order of `urls`."""
+        headers = headers or dict()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {name: pool.submit(self.fetch, url, headers.get(name)) for name, url in urls.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.session.close()
+
+
+_default_fetcher = None
+_default_lock = threading.Lock()
+
+
+def default_fetcher() -> Fetcher:
+    """The fetcher shared by everything in this process."""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher()
+        return _default_fetcher
+
+
+def reset_default_fetcher():
+    """
+    Forget the default fetcher, e.g. in a forked worker process: the fetcher of the parent, and the
+    keep-alive connections of its session, are not to be shared with it.
+    """
+    global _default_fetcher, _default_lock
+    _default_fetcher = None
+    _default_lock = threading.Lock()
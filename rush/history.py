@@ -0,0 +1,178 @@
+"""
+Rankings of all rounds in one indexed SQLite database, for questions across rounds.
+
+Every ranking of a round is a row with its rank, raw score and scaled score, as load_stats gives them.
+The rows are indexed by player, by stat and by score, so the history of a player or a stat and the
+best scores of all time are a single indexed query instead of a load of every round. A round is only
+written again when its stats changed, and every ingest is one transaction.
+
+    cache/history.sqlite
+
+Run from the project root:
+    python -m rush.history ingest [round numbers]
+    python -m rush.history player <name>
+    python -m rush.history stat <stat name> [--top n]
+    python -m rush.history best <stat name> [--top n]
+"""
+import argparse
+import os
+import sqlite3
+from collections.abc import Iterable
+from itertools import repeat
+
+from config import CACHE_DIR, ALL_ROUNDS, LEADERBOARD_SIZE
+from rush.players import player_registry
+from rush.repository import repository
+from rush.roundstats import RoundStats
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    round INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rankings (
+    round INTEGER NOT NULL,
+    stat INTEGER NOT NULL REFERENCES stats (id),
+    player INTEGER NOT NULL REFERENCES players (id),
+    rank INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    fs_score REAL NOT NULL,
+    PRIMARY KEY (round, stat, player)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rankings_by_player ON rankings (player, round);
+CREATE INDEX IF NOT EXISTS rankings_by_stat ON rankings (stat, round, rank);
+CREATE INDEX IF NOT EXISTS rankings_by_score ON rankings (stat, score DESC);
+"""
+
+
+class HistoryStore:
+    """One connection to the database. Use it from the thread that made it."""
+
+    def __init__(self, file_name: str = None):
+        self.file_name = file_name or f'{CACHE_DIR}/history.sqlite'
+        os.makedirs(os.path.dirname(self.file_name) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(self.file_name)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _ids(self, table: str, names: list[str]) -> dict[str, int]:
+        self.connection.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', zip(names))
+        return {name: id for id, name in self.connection.execute(f'SELECT id, name FROM {table}')}
+
+    def _write_round(self, round_number: int, stats: RoundStats) -> bool:
+        content_hash = stats.content_hash()
+        stored = self.connection.execute('SELECT content_hash FROM rounds WHERE round = ?', (round_number,)).fetchone()
+        if stored and stored[0] == content_hash:
+            return False
+        stat_ids = self._ids('stats', stats.stat_names)
+        player_ids = self._ids('players', stats.player_names)
+        players = [player_ids[name] for name in stats.player_names]
+        self.connection.execute('DELETE FROM rankings WHERE round = ?', (round_number,))
+        for stat, stat_name in enumerate(stats.stat_names):
+            ranked = stats.order[stat]
+            self.connection.executemany(
+                'INSERT INTO rankings VALUES (?, ?, ?, ?, ?, ?)',
+                zip(repeat(round_number), repeat(stat_ids[stat_name]), [players[player] for player in ranked.tolist()],
+                    stats.rank[stat, ranked].tolist(), stats.score[stat, ranked].tolist(),
+                    stats.fs_score[stat, ranked].tolist()))
+        self.connection.execute('INSERT OR REPLACE INTO rounds VALUES (?, ?)', (round_number, content_hash))
+        return True
+
+    def ingest(self, rounds: Iterable[tuple[int, RoundStats]]) -> list[int]:
+        """Write (round number, stats) of rounds in one transaction. Returns the rounds that changed."""
+        with self.connection:
+            return [round_number for round_number, stats in rounds if self._write_round(round_number, stats)]
+
+    def ingest_rounds(self, round_numbers: list[int]) -> list[int]:
+        """Load rounds through the repository and write them."""
+        return self.ingest((round_number, repository.stats(round_number)) for round_number in round_numbers)
+
+    def rounds(self) -> list[int]:
+        return [round_number for round_number, in self.connection.execute('SELECT round FROM rounds ORDER BY round DESC')]
+
+    def player_history(self, player: str, merge_aliases: bool = True) -> list[tuple[int, str, int, int, float]]:
+        """(round, stat, rank, score, scaled score) of a player in every round, newest first."""
+        names = [player]
+        if merge_aliases:
+            current = player_registry.canonical(player)
+            names = list({current, *(name for name in player_registry.aliases
+                                     if player_registry.canonical(name) == current)})
+        return self.connection.execute(f"""
+            SELECT r.round, s.name, r.rank, r.score, r.fs_score
+            FROM players p JOIN rankings r ON r.player = p.id JOIN stats s ON s.id = r.stat
+            WHERE p.name IN ({', '.join('?' * len(names))})
+            ORDER BY r.round DESC, s.id, r.rank""", names).fetchall()
+
+    def stat_history(self, stat_name: str, top: int = LEADERBOARD_SIZE) -> list[tuple[int, int, str, int, float]]:
+        """(round, rank, player, score, scaled score) of the top ranks of a stat in every round, newest first."""
+        return self.connection.execute("""
+            SELECT r.round, r.rank, p.name, r.score, r.fs_score
+            FROM stats s JOIN rankings r ON r.stat = s.id JOIN players p ON p.id = r.player
+            WHERE s.name = ? AND r.rank <= ?
+            ORDER BY r.round DESC, r.rank""", (stat_name, top)).fetchall()
+
+    def best(self, stat_name: str, top: int = LEADERBOARD_SIZE) -> list[tuple[str, int, int]]:
+        """(player, round, score) of the highest scores of a stat over all rounds."""
+        return self.connection.execute("""
+            SELECT p.name, r.round, r.score
+            FROM stats s JOIN rankings r ON r.stat = s.id JOIN players p ON p.id = r.player
+            WHERE s.name = ?
+            ORDER BY r.score DESC
+            LIMIT ?""", (stat_name, top)).fetchall()
+
+
+def ingest_history(round_numbers: list[int], file_name: str = None) -> list[int]:
+    """Write rounds to the history database. Returns the rounds that changed."""
+    store = HistoryStore(file_name)
+    try:
+        return store.ingest_rounds(round_numbers)
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rankings of all rounds in one database.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help='Write rounds to the database')
+    ingest.add_argument('rounds', type=int, nargs='*', help='Round numbers, by default all rounds')
+    player = commands.add_parser('player', help='Rankings of a player in every round')
+    player.add_argument('name')
+    for command, help_text in (('stat', 'Top ranks of a stat in every round'), ('best', 'Best scores of a stat ever')):
+        stat = commands.add_parser(command, help=help_text)
+        stat.add_argument('stat_name')
+        stat.add_argument('--top', type=int, default=LEADERBOARD_SIZE)
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        changed = ingest_history(args.rounds or ALL_ROUNDS)
+        print(f'{len(changed)} rounds written: {", ".join(map(str, changed))}' if changed else 'No rounds changed')
+        return
+    store = HistoryStore()
+    try:
+        if args.command == 'player':
+            rows = store.player_history(args.name)
+        elif args.command == 'stat':
+            rows = store.stat_history(args.stat_name, args.top)
+        else:
+            rows = store.best(args.stat_name, args.top)
+    finally:
+        store.close()
+    for row in rows:
+        print(','.join(map(str, row)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Top K leaderboards without sorting every player.
+
+Players with equal scores keep the order in which they were fed in, the same order a stable sort of
+all players would give them. Use a full sort only when every player is written out, like the CSV exports.
+"""
+import heapq
+from collections.abc import Iterable
+
+TOTAL = 'Total'
+
+
+class Leaderboards:
+    """Several top K leaderboards filled in one pass over the players: the total and one per category."""
+
+    def __init__(self, k: int, categories: Iterable[str] = ()):
+        self.k = k
+        self.boards = {name: list() for name in [TOTAL, *categories]}
+        self._seen = 0
+
+    def add(self, player: str, total: float, categories: dict[str, float] = None):
+        # Heaps of (score, -arrival, player): the lowest score, then the latest arrival, drops out first
+        self._seen += 1
+        self._push(self.boards[TOTAL], total, player)
+        for name, score in (categories or dict()).items():
+            self._push(self.boards[name], score, player)
+
+    def _push(self, heap: list, score: float, player: str):
+        entry = (score, -self._seen, player)
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def top(self, board: str = TOTAL) -> list[tuple[str, float]]:
+        """(player, score) of a leaderboard, best first."""
+        return [(player, score) for score, arrival, player in sorted(self.boards[board], reverse=True)]
+
+    @classmethod
+    def from_scores(cls, scores: list, k: int) -> 'Leaderboards':
+        """From the [(player, total score, {category: score})] of blop_scores_for_round."""
+        categories = scores[0][2].keys() if scores else ()
+        leaderboards = cls(k, categories)
+        for player, total, category_scores in scores:
+            leaderboards.add(player, total, category_scores)
+        return leaderboards
@@ -0,0 +1,110 @@
+"""
+Append-only archive of the raw Valhalla pages of a round, to parse them again without fetching.
+
+Every page the round cache downloads is appended as a gzip member to the archive of its round, and a
+line with its URL, fetch time, hash, validators and place in the archive is appended to the index. The
+URL is the one the page was fetched from, without fragment. A page is only added again when its content
+changed, so the archive of a live round holds every version of its pages. Nothing is ever rewritten: a
+page whose index line is missing after a crash is ignored.
+
+    cache/pages/round_N.html.gz     zcat shows every page
+    cache/pages/round_N.index       One JSON line per page
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, asdict
+from datetime import datetime
+
+ARCHIVE_FILE = re.compile(r'round_(\d+)\.index')
+
+_append_lock = threading.Lock()
+
+
+@dataclass
+class ArchivedPage:
+    """Where a page is in the archive. Also stands in for the response it came from when parsing again."""
+    url: str
+    fetched: str
+    sha256: str
+    offset: int
+    length: int
+    etag: str | None = None
+    last_modified: str | None = None
+    content: bytes | None = None
+
+    status_code = 200
+
+
+class PageArchive:
+    def __init__(self, round_number: int, archive_dir: str):
+        self.round_number = round_number
+        self.archive_dir = archive_dir
+        self._latest = None
+
+    @property
+    def file_name(self) -> str:
+        return f'{self.archive_dir}/round_{self.round_number}.html.gz'
+
+    @property
+    def index_file_name(self) -> str:
+        return f'{self.archive_dir}/round_{self.round_number}.index'
+
+    def index(self) -> list[ArchivedPage]:
+        """Every archived page, oldest first."""
+        pages = list()
+        if os.path.exists(self.index_file_name):
+            with open(self.index_file_name) as f:
+                for line in f:
+                    try:
+                        pages.append(ArchivedPage(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        print(f'Warning: skipping a broken line in {self.index_file_name}')
+        return pages
+
+    def latest(self) -> dict[str, ArchivedPage]:
+        """The last archived version of every URL, read from the index on first use."""
+        if self._latest is None:
+            self._latest = {page.url: page for page in self.index()}
+        return self._latest
+
+    def add(self, url: str, response) -> bool:
+        """Append the page of a response, unless its last version is the same. Returns whether it was added."""
+        sha256 = hashlib.sha256(response.content).hexdigest()
+        with _append_lock:
+            last = self.latest().get(url)
+            if last and last.sha256 == sha256:
+                return False
+            os.makedirs(self.archive_dir, exist_ok=True)
+            data = gzip.compress(response.content, mtime=0)
+            with open(self.file_name, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            page = ArchivedPage(url, datetime.now().isoformat(timespec='seconds'), sha256, offset, len(data),
+                                response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            record = {key: value for key, value in asdict(page).items() if key != 'content'}
+            with open(self.index_file_name, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            self._latest[url] = page
+        return True
+
+    def read(self, page: ArchivedPage) -> ArchivedPage:
+        """The page with its content."""
+        with open(self.file_name, 'rb') as f:
+            f.seek(page.offset)
+            content = gzip.decompress(f.read(page.length))
+        if hashlib.sha256(content).hexdigest() != page.sha256:
+            raise ValueError(f'Archived page {page.url} of round {self.round_number} does not match its hash')
+        page.content = content
+        return page
+
+
+def archived_rounds(archive_dir: str) -> list[int]:
+    """The rounds with an archive, newest first."""
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted((int(match.group(1)) for name in os.listdir(archive_dir)
+                   if (match := ARCHIVE_FILE.fullmatch(name))), reverse=True)
@@ -0,0 +1,158 @@
+"""
+All reports in one run: the Rush round and multi-round scores, the Dave scores, the title holders,
+the Top 100 wiki page and the history database of all rankings.
+
+Every report is a stage of a graph that names the stages it needs. Every round the reports use is
+loaded by a stage of its own, once, without a stat filter, as the Dave scores, title holders and history
+use it. The dom stats scaled by the scoring config of the round, as the Rush scores use them, are
+derived from that load by another stage. The reports that need a round then take the shared stats
+from the repository. Stages run as soon as what
+they need is done, independent ones at the same time. The Rush scores are calculated in the thread of
+their stage: forking scoring workers while other stages run is not safe. With --only just the chosen
+reports run, and only the rounds they need are loaded.
+
+Run from the project root:  python -m rush.pipeline [--only rush-round titles ...] [--workers n]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Callable
+
+from config import OUT_DIR, ALL_BLOP_ROUNDS, ALL_ROUNDS, LAST_TEN_ROUNDS, LAST_ROUND, PIPELINE_WORKERS
+from rush import profiling
+from rush.daverankings import write_dave_scores
+from rush.history import ingest_history
+from rush.repository import repository
+from rush.rushrankings import round_scores, multiple_round_scores, round_stats_for_config
+from rush.titleholders import round_title_holders
+from tophundred import write_top_hundreds
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], object]
+    needs: tuple[str, ...] = ()
+
+
+def load_stage(round_number: int) -> str:
+    return f'load:{round_number}'
+
+
+def load_stages(round_numbers) -> tuple[str, ...]:
+    return tuple(load_stage(round_number) for round_number in round_numbers)
+
+
+def rush_load_stage(round_number: int) -> str:
+    return f'load-rush:{round_number}'
+
+
+def rush_load_stages(round_numbers) -> tuple[str, ...]:
+    return tuple(rush_load_stage(round_number) for round_number in round_numbers)
+
+
+def report_stages(out_dir: str = OUT_DIR) -> dict[str, Stage]:
+    """All stages, by name."""
+    def rush_rounds(round_numbers):
+        return lambda: multiple_round_scores(ALL_BLOP_ROUNDS, round_numbers, out_dir, workers=1)
+
+    stages = [Stage(load_stage(round_number), lambda round_number=round_number: repository.stats(round_number))
+              for round_number in ALL_ROUNDS]
+    # The same key of the repository as the Rush scores ask for, derived from the load of the round
+    stages += [Stage(rush_load_stage(round_number),
+                     lambda round_number=round_number: round_stats_for_config(ALL_BLOP_ROUNDS[round_number], round_number),
+                     load_stages([round_number]))
+               for round_number in ALL_ROUNDS]
+    stages += [
+        Stage('rush-round', lambda: round_scores(ALL_BLOP_ROUNDS[LAST_ROUND], LAST_ROUND, out_dir, with_categories=True),
+              rush_load_stages([LAST_ROUND])),
+        # After the round and the last ten, so their stored scores are reused instead of scored twice at once
+        Stage('rush-last-ten', rush_rounds(LAST_TEN_ROUNDS), rush_load_stages(LAST_TEN_ROUNDS) + ('rush-round',)),
+        Stage('rush-lifetime', rush_rounds(ALL_ROUNDS), rush_load_stages(ALL_ROUNDS) + ('rush-last-ten',)),
+        Stage('dave', lambda: write_dave_scores(ALL_ROUNDS, out_dir), load_stages(ALL_ROUNDS)),
+        Stage('titles', lambda: round_title_holders([LAST_ROUND], out_dir), load_stages([LAST_ROUND])),
+        # Its page goes into the same round file as the loads of the round, which must not be written by two
+        # stages at once
+        Stage('top100', lambda: write_top_hundreds([LAST_ROUND], out_dir),
+              load_stages([LAST_ROUND]) + rush_load_stages([LAST_ROUND])),
+        Stage('history', lambda: ingest_history(ALL_ROUNDS), load_stages(ALL_ROUNDS)),
+    ]
+    return {s.name: s for s in stages}
+
+
+REPORTS = ('rush-round', 'rush-last-ten', 'rush-lifetime', 'dave', 'titles', 'top100', 'history')
+
+
+def needed_stages(stages: dict[str, Stage], targets) -> list[str]:
+    """The targets and everything they need, in the order the stages are defined."""
+    needed = set()
+    to_visit = list(targets)
+    while to_visit:
+        name = to_visit.pop()
+        if name not in stages:
+            raise ValueError(f'Unknown stage {name!r}')
+        if name not in needed:
+            needed.add(name)
+            to_visit.extend(stages[name].needs)
+    return [name for name in stages if name in needed]
+
+
+def run_stage(stage: Stage) -> float:
+    start = time.perf_counter()
+    with profiling.stage(f'pipeline.{stage.name}'):
+        stage.run()
+    return time.perf_counter() - start
+
+
+def run_pipeline(stages: dict[str, Stage], targets, workers: int = PIPELINE_WORKERS) -> dict[str, Exception | None]:
+    """
+    Run the targets and what they need. Returns the stages that failed with their error, and the ones
+    skipped because something they need failed with None.
+    """
+    waiting = {name: set(stages[name].needs) for name in needed_stages(stages, targets)}
+    failed = dict()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = dict()
+        while waiting or running:
+            for name, needs in list(waiting.items()):
+                # In definition order, so a skipped stage is known before the stages that need it
+                if needs & failed.keys():
+                    del waiting[name]
+                    failed[name] = None
+                    print(f'Skipping {name}: {", ".join(sorted(needs & failed.keys()))} failed')
+                elif not needs:
+                    del waiting[name]
+                    running[pool.submit(run_stage, stages[name])] = name
+            if not running:
+                if waiting:
+                    raise ValueError(f'Stages that need each other: {", ".join(waiting)}')
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    print(f'-- {name} done in {future.result():.2f}s')
+                except Exception as e:
+                    failed[name] = e
+                    print(f'-- {name} failed: {e!r}')
+                    continue
+                for needs in waiting.values():
+                    needs.discard(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build all reports, loading every round once.')
+    parser.add_argument('--only', nargs='+', choices=REPORTS, metavar='REPORT',
+                        help=f'Reports to build, of: {", ".join(REPORTS)}')
+    parser.add_argument('--workers', type=int, default=PIPELINE_WORKERS, help='Stages run at the same time')
+    args = parser.parse_args()
+
+    failed = run_pipeline(report_stages(), args.only or REPORTS, args.workers)
+    if failed:
+        raise SystemExit(f'Failed: {", ".join(failed)}')
+
+
+if __name__ == '__main__':
+    main()
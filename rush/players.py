@@ -0,0 +1,92 @@
+"""
+Player identities across rounds, and scores of many rounds as one players x rounds array.
+
+The registry interns every player name to an integer id once per process. Players who changed their
+name can be merged through config.PLAYER_ALIASES, which maps an old name to the current one.
+"""
+from dataclasses import dataclass
+from collections.abc import Iterable
+
+import numpy as np
+
+from config import PLAYER_ALIASES
+
+
+class PlayerRegistry:
+    def __init__(self, aliases: dict[str, str] = None):
+        self.aliases = aliases or dict()
+        self.names = list()
+        self.ids = dict()
+
+    def canonical(self, name: str) -> str:
+        """The current name of a player, following renames."""
+        seen = {name}
+        while name in self.aliases:
+            name = self.aliases[name]
+            if name in seen:
+                raise ValueError(f'Player aliases form a loop at {name!r}')
+            seen.add(name)
+        return name
+
+    def intern(self, name: str, merge_aliases: bool = True) -> int:
+        if merge_aliases:
+            name = self.canonical(name)
+        player_id = self.ids.get(name)
+        if player_id is None:
+            player_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return player_id
+
+    def intern_all(self, names: Iterable[str], merge_aliases: bool = True) -> np.ndarray:
+        return np.array([self.intern(name, merge_aliases) for name in names], dtype=np.int64)
+
+    def name(self, player_id: int) -> str:
+        return self.names[player_id]
+
+
+@dataclass
+class ScoreMatrix:
+    """Scores of players over a series of rounds. Players are in order of first appearance."""
+    registry: PlayerRegistry
+    players: np.ndarray         # Registry ids of the rows
+    round_numbers: list[int]    # Rounds of the columns
+    scores: np.ndarray          # (player x round), 0 where the player did not play
+    present: np.ndarray         # (player x round), whether the player has a score
+
+    @classmethod
+    def from_rounds(cls, scores_per_round: dict[int, list[tuple[str, float]]], registry: PlayerRegistry = None,
+                    merge_aliases: bool = True, dtype=np.float64) -> 'ScoreMatrix':
+        """From {round number: [(player, score)]}. A player merged from two names in one round keeps the best score."""
+        registry = registry or player_registry
+        round_numbers = list(scores_per_round)
+        row_of = dict()
+        round_rows = list()
+        for round_scores in scores_per_round.values():
+            ids = registry.intern_all((player for player, score in round_scores), merge_aliases)
+            round_rows.append(np.array([row_of.setdefault(player, len(row_of)) for player in ids.tolist()],
+                                       dtype=np.int64))
+
+        scores = np.zeros((len(row_of), len(round_numbers)), dtype=dtype)
+        present = np.zeros(scores.shape, dtype=bool)
+        for column, (rows, round_scores) in enumerate(zip(round_rows, scores_per_round.values())):
+            values = np.array([score for player, score in round_scores], dtype=dtype)
+            if len(np.unique(rows)) < len(rows):
+                np.maximum.at(scores[:, column], rows, values)
+            else:
+                scores[rows, column] = values
+            present[rows, column] = True
+        return cls(registry, np.array(list(row_of), dtype=np.int64), round_numbers, scores, present)
+
+    def names(self) -> list[str]:
+        return [self.registry.name(player) for player in self.players.tolist()]
+
+    def totals(self) -> np.ndarray:
+        """Sum over the rounds, added up round by round in column order."""
+        totals = np.zeros(len(self.players), dtype=self.scores.dtype)
+        for column in range(len(self.round_numbers)):
+            totals += self.scores[:, column]
+        return totals
+
+
+# Shared by everything in this process
+player_registry = PlayerRegistry(PLAYER_ALIASES)
@@ -0,0 +1,155 @@
+"""
+Stage timings and counters of a run, for finding out where the time goes.
+
+Code marks its stages with `stage(name)` or `@timed(name)` and counts things with `count(name, amount)`.
+Nothing is recorded until `enable()` is called; until then every hook is a single check of a global.
+Stages nest, so the time of a stage includes the time of the stages inside it. Stages that run in
+several threads at once, like fetching, add up to more than the wall time.
+
+Worker processes profile their own tasks, see `start_task` and `merge`.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+_profile = None
+_NO_STAGE = nullcontext()
+
+
+class Profile:
+    def __init__(self):
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = dict()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float, calls: int = 1):
+        with self.lock:
+            total = self.stages.setdefault(name, [0, 0.0])
+            total[0] += calls
+            total[1] += seconds
+
+    def add(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return dict(stages={name: dict(calls=calls, seconds=round(seconds, 6))
+                                for name, (calls, seconds) in self.stages.items()},
+                        counters=dict(self.counters))
+
+    def merge(self, data: dict):
+        """Add the stages and counters of a profile taken elsewhere, e.g. in a worker process."""
+        for name, total in data['stages'].items():
+            self.add_stage(name, total['seconds'], total['calls'])
+        for name, amount in data['counters'].items():
+            self.add(name, amount)
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if _profile is not None:
+            _profile.add_stage(self.name, time.perf_counter() - self.start)
+
+
+def stage(name: str):
+    """Context manager timing a stage of the run."""
+    return _NO_STAGE if _profile is None else _Stage(name)
+
+
+def timed(name: str):
+    """Decorator timing every call of a function as a stage."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profile is None:
+                return function(*args, **kwargs)
+            with _Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, amount: int = 1):
+    if _profile is not None:
+        _profile.add(name, amount)
+
+
+def enabled() -> bool:
+    return _profile is not None
+
+
+def enable() -> Profile:
+    """Start recording, with a fresh profile."""
+    global _profile
+    _profile = Profile()
+    return _profile
+
+
+def disable() -> Profile | None:
+    """Stop recording. Returns what was recorded."""
+    global _profile
+    profile, _profile = _profile, None
+    return profile
+
+
+def start_task(profiling: bool):
+    """In a worker process: record the task about to run if the parent profiles, and nothing otherwise."""
+    if profiling:
+        enable()
+    else:
+        disable()
+
+
+def finish_task() -> dict | None:
+    """In a worker process: what the task recorded, to `merge` into the profile of the parent."""
+    profile = disable()
+    return profile.as_dict() if profile else None
+
+
+def merge(data: dict | None):
+    if _profile is not None and data:
+        _profile.merge(data)
+
+
+def peak_memory() -> dict:
+    """Peak resident set size in kB of this process and of its finished worker processes, where known."""
+    if resource is None:
+        return dict()
+    # ru_maxrss is in kB on Linux, in bytes on macOS
+    scale = 1024 if os.uname().sysname == 'Darwin' else 1
+    return dict(peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+                peak_rss_children_kb=resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale)
+
+
+def write_report(file_name: str, **extra):
+    """Write the profile of the run as JSON, with anything in `extra` added at the top level."""
+    if _profile is None:
+        return
+    report = dict(started=_profile.started.isoformat(timespec='seconds'),
+                  wall_seconds=round(time.perf_counter() - _profile.start, 6),
+                  **peak_memory(), **extra, **_profile.as_dict())
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+    with open(file_name, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Profile written to', file_name)
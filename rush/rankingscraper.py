@@ -1,18 +1,25 @@
 """
 Utility to scrape the Valhalla pages and extract ranking information.
 
-Round
-    Stat
-        Ranking
+Round           RoundStats
+    Stat        StatView
+        Ranking RankingView
 """
-import os.path
 from dataclasses import dataclass
-import requests
-from bs4 import BeautifulSoup
-from typing import Callable
-import pickle
+from typing import Callable, TYPE_CHECKING
 
-from config import VALHALLA_URL, CACHE_DIR
+import numpy as np
+
+from config import VALHALLA_URL, LIVE_ROUNDS
+from rush.fetcher import Fetcher, default_fetcher
+from rush.profiling import stage, timed, count
+from rush.roundcache import RoundCache
+from rush.roundstats import RoundStats
+from rush.scaling import scale_round, scale_column
+from rush.tableparser import extract_table, UnexpectedMarkup
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 NOBODY_PLAYER = 'Nobody (Empty Categories)'
 
@@ -25,25 +32,73 @@ class Ranking:
     fs_score: float = 0
 
 
-def get_page(page_url: str) -> BeautifulSoup | None:
-    """Utility function to load a URL into a BeautifulSoup instance."""
-    page = requests.get(page_url)
-    if page.status_code == 200:
-        return BeautifulSoup(page.content, "html.parser")
+def make_soup(response) -> 'BeautifulSoup | None':
+    """Turn a fetched response into a BeautifulSoup instance, if the fetch succeeded."""
+    if response is not None and response.status_code == 200:
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(response.content, "html.parser")
     else:
         return None
 
 
-def get_stat_page_urls(round_number: int) -> dict[str, str]:
+@timed('get_page')
+def get_page(page_url: str, fetcher: Fetcher = None) -> 'BeautifulSoup | None':
+    """Utility function to load a URL into a BeautifulSoup instance."""
+    fetcher = fetcher or default_fetcher()
+    return make_soup(fetcher.fetch(page_url))
+
+
+def get_round_url(round_number: int) -> str:
+    return '/'.join([VALHALLA_URL, str(round_number)])
+
+
+def parse_stat_page_urls(soup: 'BeautifulSoup', round_url: str) -> dict[str, str]:
+    """Pull the stat page URLs out of the stat overview page of a round."""
+    return {link.text: link['href'] for link in soup.find_all('a') if link['href'].startswith(round_url)}
+
+
+def get_stat_page_urls(round_number: int, fetcher: Fetcher = None) -> dict[str, str]:
     """Retrieve all stat page URLs from the stat overview page of the round."""
-    round_url = '/'.join([VALHALLA_URL, str(round_number)])
-    page = get_page(round_url)
-    stat_page_urls = {link.text: link['href'] for link in page.find_all('a') if link['href'].startswith(round_url)}
-    return stat_page_urls
+    round_url = get_round_url(round_number)
+    page = get_page(round_url, fetcher)
+    return parse_stat_page_urls(page, round_url)
+
+
+def ranking_from_cells(entry: list[str]) -> Ranking:
+    return Ranking(int(entry[0]), entry[2], int(entry[-1].replace(',', '')))
 
 
-def parse_entries_from_page(soup: BeautifulSoup) -> dict[str, Ranking]:
+def fast_parse_entries(page: str | bytes) -> dict[str, Ranking]:
+    """Pull rankings out of the raw HTML of a stat page without building a document tree."""
+    table = extract_table(page)
+    if not table.box_body_found:
+        raise UnexpectedMarkup('No box-body div')
+    if table.no_records:
+        print('No records found.')
+        return {NOBODY_PLAYER: Ranking(0, NOBODY_PLAYER, 0)}
+    if table.rows is None:
+        raise UnexpectedMarkup('No table body')
+    try:
+        rankings = [ranking_from_cells(entry) for entry in table.rows]
+    except (IndexError, ValueError) as e:
+        raise UnexpectedMarkup(f'Unexpected table cells: {e}')
+    return {ranking.player: ranking for ranking in rankings}
+
+
+@timed('parse')
+def parse_entries_from_page(page: 'str | bytes | BeautifulSoup') -> dict[str, Ranking]:
     """Pull rankings out of a stat page into a dict{player name: Ranking}."""
+    count('pages_parsed')
+    if not isinstance(page, (str, bytes)):
+        soup = page
+    else:
+        try:
+            return fast_parse_entries(page)
+        except UnexpectedMarkup as e:
+            print(f'Falling back to BeautifulSoup: {e}')
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(page, "html.parser")
+
     results = dict()
     try:
         # Rare case (happens in test rounds) that no one scored for a category.
@@ -54,7 +109,7 @@ def parse_entries_from_page(soup: BeautifulSoup) -> dict[str, Ranking]:
 
         for line in soup.tbody.find_all('tr'):
             entry = [child.text.strip() for child in line.find_all('td')]
-            ranking = Ranking(int(entry[0]), entry[2], int(entry[-1].replace(',', '')))
+            ranking = ranking_from_cells(entry)
             results[ranking.player] = ranking
     except AttributeError:
         # If anything goes wrong, it's likely the page that changed. Print it for analysis.
@@ -63,56 +118,27 @@ def parse_entries_from_page(soup: BeautifulSoup) -> dict[str, Ranking]:
     return results
 
 
+@timed('scale')
 def feature_scaled_scores(rankings: dict, low=0, high=1, method='linear'):
     """Compress a series of scores into a range from 0 (lowest score) to 1 (highest score)."""
-    import math
-
-    max_score = max([r.score for r in rankings.values()])
-    min_score = min([r.score for r in rankings.values()])
-
-    if method == 'log':
-        # Log scaling with diminishing returns - compresses top outliers
-        for r in rankings.values():
-            if max_score - min_score > 0:
-                # Use log(1 + score) to handle zero scores gracefully
-                log_score = math.log(1 + r.score - min_score)
-                log_max = math.log(1 + max_score - min_score)
-                r.fs_score = low + (log_score * (high - low)) / log_max
-            else:
-                r.fs_score = 1
-    elif method == 'power':
-        # Power scaling - penalizes low scores more, rewards normal-high scores
-        # Uses square (power=2) to create more separation in the lower range
-        for r in rankings.values():
-            if max_score - min_score > 0:
-                linear = (r.score - min_score) / (max_score - min_score)
-                r.fs_score = low + (linear ** 2) * (high - low)
-            else:
-                r.fs_score = 1
-    elif method == 'logpower':
-        # Combination: log to compress top outliers, then power to separate mid/low
-        for r in rankings.values():
-            if max_score - min_score > 0:
-                # First apply log compression
-                log_score = math.log(1 + r.score - min_score)
-                log_max = math.log(1 + max_score - min_score)
-                log_normalized = log_score / log_max
-                # Then apply power to create separation at lower end
-                r.fs_score = low + (log_normalized ** 1.5) * (high - low)
-            else:
-                r.fs_score = 1
-    else:
-        # Original linear scaling
-        for r in rankings.values():
-            if max_score - min_score > 0:
-                r.fs_score = low + ((r.score - min_score) * (high - low)) / (max_score - min_score)
-            else:
-                r.fs_score = 1
+    scores = np.fromiter((r.score for r in rankings.values()), dtype=np.int64, count=len(rankings))
+    for r, fs_score in zip(rankings.values(), scale_column(scores, method, low, high).tolist()):
+        r.fs_score = fs_score
 
 def null_filter(stat_name: str) -> bool:
     return True
 
 
+def land_sizes_from_stats(stats: dict) -> dict:
+    """Extract {player_name: land_size} from all "Largest" stats of a round."""
+    land_sizes = {}
+    for stat_name, rankings in stats.items():
+        if 'Largest' in stat_name and 'Harem' not in stat_name:
+            for player_name, ranking in rankings.items():
+                land_sizes[player_name] = ranking.score
+    return land_sizes
+
+
 def get_all_land_sizes(round_number: int, stat_filter=None) -> dict:
     """Get land sizes for all players from cached stats.
 
@@ -123,55 +149,66 @@ def get_all_land_sizes(round_number: int, stat_filter=None) -> dict:
         Dict of {player_name: land_size}
     """
     # Load all stats (should use cache if available)
-    all_stats = load_stats(round_number, stat_filter=stat_filter)
+    return land_sizes_from_stats(load_stats(round_number, stat_filter=stat_filter))
 
-    land_sizes = {}
 
-    # Extract land data from all "Largest" stats in cached data
-    for stat_name, rankings in all_stats.items():
-        if 'Largest' in stat_name and 'Harem' not in stat_name:
-            for player_name, ranking in rankings.items():
-                land_sizes[player_name] = ranking.score
+def parse_stat_page(name: str, response) -> dict[str, Ranking]:
+    """Parse a fetched stat page. Returns an empty dict if the page could not be loaded."""
+    if response is None or response.status_code != 200:
+        print("Warning: could not load page", response.url if response is not None else name)
+        return dict()
+    print('Loading', name)
+    return parse_entries_from_page(response.content)
 
-    return land_sizes
+
+def get_cached_stat_pages(round_number: int, stat_filter: Callable[[str], bool], fetcher: Fetcher,
+                          cache: RoundCache = None, live: bool = None) -> dict:
+    """
+    Stat pages of the round through the round cache: from disk for finished rounds, revalidated for live ones.
+    Pass `live` to override config.LIVE_ROUNDS.
+    """
+    cache = cache or RoundCache(round_number)
+    if live is None:
+        live = round_number in LIVE_ROUNDS
+    round_url = get_round_url(round_number)
+    index = cache.get({'index': round_url},
+                      lambda name, response: parse_stat_page_urls(make_soup(response), round_url),
+                      fetcher, live)
+    if 'index' not in index:
+        raise ConnectionError(f'Could not load the stat index of round {round_number}')
+    stat_pages = {k: v for k, v in index['index'].items() if stat_filter(k)}
+    result = cache.get(stat_pages, parse_stat_page, fetcher, live)
+    print(f'Round {round_number} cache: {cache.counters}')
+    return result
 
 
-def load_stats(round_number: int, stat_filter: Callable[[str], int]=None, use_cache=True, scaling_methods: dict = None) -> dict:
+def load_stats(round_number: int, stat_filter: Callable[[str], int]=None, use_cache=True, scaling_methods: dict = None,
+               fetcher: Fetcher = None) -> RoundStats:
     """Pull all the Valhalla ranking pages and returns all the relevant ranking lists for a specific round."""
     if not stat_filter:
         stat_filter = null_filter
+    fetcher = fetcher or default_fetcher()
 
-    stat_page_urls = get_stat_page_urls(round_number)
-    stat_pages = {k: v for k, v in stat_page_urls.items() if stat_filter(k)}
-
-    cache_file_name = f'{CACHE_DIR}/round_{round_number}.pickle'
-    if os.path.exists(cache_file_name) and use_cache:
-        print('Loading cached file', cache_file_name)
-        with open(cache_file_name, 'rb') as f:
-            result = pickle.load(f)
+    if use_cache:
+        with stage('load_stats.cache'):
+            pages = get_cached_stat_pages(round_number, stat_filter, fetcher)
     else:
-        result = dict()
-        for name, url in stat_pages.items():
-            page = get_page(url)
-            if page:
-                print('Loading', name)
-                page_stats = parse_entries_from_page(page)
-                if page_stats:
-                    result[name] = page_stats
-                else:
-                    print(f'No stats for {name}')
-            else:
-                print("Warning: could not load page", url)
-        if use_cache:
-            with open(cache_file_name, 'wb') as f:
-                pickle.dump(result, f)
+        with stage('load_stats.fetch'):
+            stat_pages = {k: v for k, v in get_stat_page_urls(round_number, fetcher).items() if stat_filter(k)}
+            responses = fetcher.fetch_all(stat_pages)
+            pages = {name: parse_stat_page(name, responses[name]) for name in stat_pages}
+
+    rankings = dict()
+    for name, page_stats in pages.items():
+        if page_stats:
+            rankings[name] = page_stats
+        else:
+            print(f'No stats for {name}')
+    with stage('load_stats.build'):
+        result = RoundStats.from_rankings(rankings)
 
     # Apply feature scaling after loading from cache or fresh data
-    for stat_name, rankings in result.items():
-        if rankings:  # Skip empty rankings
-            method = 'linear'  # default
-            if scaling_methods and stat_name in scaling_methods:
-                method = scaling_methods[stat_name]
-            feature_scaled_scores(rankings, method=method)
+    with stage('scale'):
+        scale_round(result, scaling_methods)
 
     return result
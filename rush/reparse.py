@@ -0,0 +1,103 @@
+"""
+Rebuild the round cache from the page archive, without a single request.
+
+After a change to the markup of the Valhalla pages or a fix in one of the parsers, every archived round
+is parsed again from its raw pages: the stat index, the stat pages and the Top 100 table. The last
+archived version of each page replaces the cached one, with the validators it was fetched with. Cached
+pages that are not in the archive are kept as they are. Rounds are parsed in a pool of worker processes.
+
+Run from the project root:  python -m rush.reparse [round ids] [--workers n]
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, urldefrag
+
+from config import CACHE_DIR, SCORING_WORKERS
+from rush.pagearchive import ArchivedPage, archived_rounds
+from rush.rankingscraper import get_round_url, make_soup, parse_stat_page_urls, parse_stat_page
+from rush.roundcache import RoundCache, CacheEntry
+from rush.tableparser import UnexpectedMarkup
+from tophundred import TABLE_SUFFIX, parse_table, page_url as top_hundred_url
+
+
+def page_path(url: str) -> str:
+    """The part of a URL that is the same whatever site the page was archived from."""
+    return urlsplit(url).path.rstrip('/')
+
+
+def parse_archived(round_number: int, url: str, page: ArchivedPage, names: dict[str, str]) -> dict[str, object]:
+    """
+    {cache URL: parsed contents} of an archived page: its stat rankings, its Top 100 table or both.
+    `names` are the stat names of the round by page path.
+    """
+    parsed = dict()
+    if page_path(url) in names:
+        parsed[url] = parse_stat_page(names[page_path(url)], page)
+    # Archives made before pages were archived without their fragment have the table page under its cache URL
+    if page_path(url) == page_path(top_hundred_url(round_number)) or url.endswith(TABLE_SUFFIX):
+        parsed[urldefrag(url).url + TABLE_SUFFIX] = parse_table(url, page)
+    if not parsed:
+        print(f'Warning: skipping archived page {url} of round {round_number}, it is not a page of the round')
+    return parsed
+
+
+def reparse_round(round_number: int, cache_dir: str = CACHE_DIR) -> int:
+    """Parse the archived pages of a round into its round file. Returns the number of pages parsed."""
+    cache = RoundCache(round_number, cache_dir)
+    parsed = 0
+    try:
+        pages = cache.archive.latest()
+        # Pages are found by their path, so an archive of another site (see config.OD_BASE) parses the same
+        index_path = page_path(get_round_url(round_number))
+        index = next((page for url, page in pages.items() if page_path(url) == index_path), None)
+        names = dict()
+        if index is None:
+            print(f'Warning: no stat index archived for round {round_number}, only its Top 100 table can be parsed')
+        else:
+            soup = make_soup(cache.archive.read(index))
+            # The links on the index are of the site it was fetched from, or else of the current one
+            stat_urls = parse_stat_page_urls(soup, index.url) or parse_stat_page_urls(soup, get_round_url(round_number))
+            names = {page_path(url): name for name, url in stat_urls.items()}
+            cache.save_page(CacheEntry(index.url, stat_urls, index.etag, index.last_modified, index.sha256))
+            parsed += 1
+        for url, page in pages.items():
+            if page is index:
+                continue
+            page = cache.archive.read(page)
+            try:
+                contents = parse_archived(round_number, url, page, names)
+            except (UnexpectedMarkup, AttributeError, IndexError, ValueError) as e:
+                print(f'Warning: skipping archived page {url} of round {round_number}, it could not be parsed: {e!r}')
+                continue
+            for cache_url, data in contents.items():
+                cache.save_page(CacheEntry(cache_url, data, page.etag, page.last_modified, page.sha256))
+            parsed += bool(contents)
+        cache.flush()
+    finally:
+        cache.close()
+    return parsed
+
+
+def reparse_rounds(round_numbers: list[int], cache_dir: str = CACHE_DIR, workers: int = SCORING_WORKERS) -> dict[int, int]:
+    """Parse rounds again, in a pool of worker processes if `workers` > 1. Returns {round: pages parsed}."""
+    if workers <= 1 or len(round_numbers) <= 1:
+        return {round_number: reparse_round(round_number, cache_dir) for round_number in round_numbers}
+    with ProcessPoolExecutor(max_workers=min(workers, len(round_numbers))) as pool:
+        return dict(zip(round_numbers, pool.map(reparse_round, round_numbers, [cache_dir] * len(round_numbers))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse the archived pages of rounds again into the round cache.')
+    parser.add_argument('rounds', type=int, nargs='*', help='Round ids, by default every archived round')
+    parser.add_argument('--workers', type=int, default=SCORING_WORKERS, help='Rounds parsed at the same time')
+    args = parser.parse_args()
+
+    round_numbers = args.rounds or archived_rounds(f'{CACHE_DIR}/pages')
+    start = time.perf_counter()
+    parsed = reparse_rounds(round_numbers, workers=args.workers)
+    print(f'{sum(parsed.values())} pages of {len(parsed)} rounds parsed again in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
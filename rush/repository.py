@@ -0,0 +1,114 @@
+"""
+In-process repository of loaded rounds.
+
+Loading a round means reading (or fetching) its pages, building the RoundStats and scaling them.
+The repository does that once per round, stat filter and set of scaling methods, and hands out
+the same RoundStats to everything that asks for it in this process. Once a round is loaded without
+a filter, other filters and scaling methods are derived from that load instead of loaded again. Land sizes are derived once
+per round and stat filter. The least recently used rounds are dropped when the repository grows
+beyond its limits.
+
+Treat the RoundStats handed out as read-only: they are shared.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+
+from config import REPOSITORY_MAX_ROUNDS, REPOSITORY_MAX_BYTES
+from rush.rankingscraper import load_stats, land_sizes_from_stats, null_filter
+from rush.profiling import stage
+from rush.roundstats import RoundStats
+from rush.scaling import scale_round
+
+
+class RoundRepository:
+    def __init__(self, max_rounds: int = REPOSITORY_MAX_ROUNDS, max_bytes: int = REPOSITORY_MAX_BYTES):
+        self.max_rounds = max_rounds
+        self.max_bytes = max_bytes
+        self._stats = OrderedDict()
+        self._land_sizes = dict()
+        self._loading = dict()      # {key: Future} of the rounds being loaded right now
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(round_number: int, stat_filter: Callable[[str], bool] = None, scaling_methods: dict = None) -> tuple:
+        return round_number, stat_filter or null_filter, frozenset((scaling_methods or dict()).items())
+
+    def stats(self, round_number: int, stat_filter: Callable[[str], bool] = None, scaling_methods: dict = None) -> RoundStats:
+        """
+        The scaled stats of a round, loaded on first use. Rounds are loaded outside the lock, so several
+        rounds load at the same time; who asks for a round that is being loaded waits for that load.
+        """
+        key = self.key(round_number, stat_filter, scaling_methods)
+        with self._lock:
+            if key in self._stats:
+                self._stats.move_to_end(key)
+                return self._stats[key]
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = Future()
+                loader = True
+            else:
+                loader = False
+        if not loader:
+            return loading.result()
+
+        try:
+            unfiltered = self._unfiltered(round_number)
+            if unfiltered is not None:
+                with stage('repository.derive'):
+                    stats = unfiltered.subset(stat_filter or null_filter)
+                    scale_round(stats, scaling_methods)
+            else:
+                stats = load_stats(round_number, stat_filter=stat_filter, scaling_methods=scaling_methods)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            self.put(stats, round_number, stat_filter, scaling_methods)
+            del self._loading[key]
+        loading.set_result(stats)
+        return stats
+
+    def _unfiltered(self, round_number: int) -> RoundStats | None:
+        """A load of the round without a stat filter, with whatever scaling, if there is one."""
+        with self._lock:
+            return next((stats for key, stats in self._stats.items() if key[:2] == (round_number, null_filter)), None)
+
+    def put(self, stats: RoundStats, round_number: int, stat_filter: Callable[[str], bool] = None, scaling_methods: dict = None):
+        """Store already loaded stats, e.g. generated ones."""
+        with self._lock:
+            self._stats[self.key(round_number, stat_filter, scaling_methods)] = stats
+            self._evict()
+
+    def land_sizes(self, round_number: int, stat_filter: Callable[[str], bool] = None) -> dict:
+        """Land size per player. Scaling does not change the raw scores, so any loaded variant will do."""
+        land_key = self.key(round_number, stat_filter)[:2]
+        with self._lock:
+            if land_key in self._land_sizes:
+                return self._land_sizes[land_key]
+            loaded = [stats for key, stats in self._stats.items() if key[:2] == land_key]
+        stats = loaded[0] if loaded else self.stats(round_number, stat_filter)
+        land_sizes = land_sizes_from_stats(stats)
+        with self._lock:
+            return self._land_sizes.setdefault(land_key, land_sizes)
+
+    def clear(self, round_number: int = None):
+        """Forget one round, or everything."""
+        with self._lock:
+            for key in [key for key in self._stats if round_number is None or key[0] == round_number]:
+                del self._stats[key]
+            for key in [key for key in self._land_sizes if round_number is None or key[0] == round_number]:
+                del self._land_sizes[key]
+
+    def _evict(self):
+        while len(self._stats) > 1 and (len(self._stats) > self.max_rounds or
+                                        sum(stats.nbytes for stats in self._stats.values()) > self.max_bytes):
+            self._stats.popitem(last=False)
+
+
+# Shared by everything in this process
+repository = RoundRepository()
@@ -0,0 +1,50 @@
+"""
+On-disk store of the scores of a round.
+
+The scores of a round only change when its scoring config or its stats change, so they are stored
+under a key made of a hash of both. Multi-round reports are then rebuilt from the stored rounds, and
+only a new round, changed round data or a changed config version cause a round to be scored again.
+
+    cache/results/round_N_<config hash>_<stats hash>.json
+"""
+import glob
+import hashlib
+import json
+import os
+
+from config import CACHE_DIR, scoring_configs
+from rush.roundstats import RoundStats
+
+# Bump when a change in the scoring code changes the scores, to invalidate all stored results.
+RESULTS_VERSION = 1
+
+
+class ResultStore:
+    def __init__(self, store_dir: str = None):
+        self.store_dir = store_dir or f'{CACHE_DIR}/results'
+
+    def file_name(self, round_number: int, config: dict, stats: RoundStats) -> str:
+        config_key = f'{RESULTS_VERSION}-{scoring_configs.hash(config)}'
+        config_key = hashlib.sha256(config_key.encode()).hexdigest()[:16]
+        return f'{self.store_dir}/round_{round_number}_{config_key}_{stats.content_hash()[:16]}.json'
+
+    def load(self, round_number: int, config: dict, stats: RoundStats) -> list | None:
+        """Stored [(player, total score, {category: score})] of the round, or None if it needs scoring."""
+        file_name = self.file_name(round_number, config, stats)
+        if not os.path.exists(file_name):
+            return None
+        with open(file_name) as f:
+            return [(player, score, categories) for player, score, categories in json.load(f)]
+
+    def save(self, round_number: int, config: dict, stats: RoundStats, scores: list):
+        file_name = self.file_name(round_number, config, stats)
+        os.makedirs(self.store_dir, exist_ok=True)
+        # Results of earlier data of this round with this config are outdated now
+        for outdated in glob.glob(file_name.rsplit('_', 1)[0] + '_*.json'):
+            os.remove(outdated)
+        with open(file_name + '.tmp', 'w') as f:
+            json.dump(scores, f)
+        os.replace(file_name + '.tmp', file_name)
+
+
+result_store = ResultStore()
@@ -0,0 +1,178 @@
+"""
+On-disk cache of the Valhalla pages of a round.
+
+The stat index of a round and each of its stat pages are stored separately, together with the
+ETag and Last-Modified validators of the response they came from. Finished rounds are served
+from disk without touching the network. Pages of live rounds are revalidated with conditional
+GETs, so only the pages that changed are downloaded and parsed again.
+
+All pages of a round are kept in one binary round file, see rush.roundfile. The raw HTML of every
+downloaded page goes into the archive of the round as well, see rush.pagearchive:
+
+    cache/round_N.odr
+    cache/pages/round_N.html.gz
+"""
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from urllib.parse import urldefrag
+
+from config import CACHE_DIR, ARCHIVE_PAGES
+from rush.pagearchive import PageArchive
+from rush.profiling import stage
+from rush.roundfile import CacheEntry, RoundFileError, read_round_file, write_round_file, as_stored, in_memory
+
+
+@dataclass
+class CacheCounters:
+    hits: int = 0           # Served from disk without a request
+    misses: int = 0         # Not cached yet, downloaded
+    revalidated: int = 0    # Conditional GET answered with 304 Not Modified
+    changed: int = 0        # Conditional GET returned new content
+    stale: int = 0          # Request failed, served the cached copy anyway
+
+    def add(self, other: 'CacheCounters'):
+        self.hits += other.hits
+        self.misses += other.misses
+        self.revalidated += other.revalidated
+        self.changed += other.changed
+        self.stale += other.stale
+
+    def since(self, earlier: 'CacheCounters') -> 'CacheCounters':
+        return CacheCounters(self.hits - earlier.hits, self.misses - earlier.misses,
+                             self.revalidated - earlier.revalidated, self.changed - earlier.changed,
+                             self.stale - earlier.stale)
+
+    def __str__(self):
+        return (f'{self.hits} hits, {self.misses} misses, {self.revalidated} revalidated, '
+                f'{self.changed} changed, {self.stale} stale')
+
+
+# Totals over all rounds loaded by this process
+run_counters = CacheCounters()
+
+
+def entry_from_response(url: str, response, data) -> CacheEntry:
+    return CacheEntry(url, data,
+                      etag=response.headers.get('ETag'),
+                      last_modified=response.headers.get('Last-Modified'),
+                      sha256=hashlib.sha256(response.content).hexdigest())
+
+
+@dataclass
+class RoundCache:
+    round_number: int
+    cache_dir: str = CACHE_DIR
+    counters: CacheCounters = field(default_factory=CacheCounters)
+    archive_pages: bool = ARCHIVE_PAGES
+    # Names of the pages that were downloaded and parsed again by the last get()
+    last_changed: set[str] = field(default_factory=set)
+    _entries: dict[str, CacheEntry] | None = field(default=None, repr=False)
+    _buffer: Any = field(default=None, repr=False)
+    _dirty: bool = field(default=False, repr=False)
+    _archive: PageArchive | None = field(default=None, repr=False)
+
+    @property
+    def file_name(self) -> str:
+        return f'{self.cache_dir}/round_{self.round_number}.odr'
+
+    @property
+    def archive(self) -> PageArchive:
+        if self._archive is None:
+            self._archive = PageArchive(self.round_number, f'{self.cache_dir}/pages')
+        return self._archive
+
+    @property
+    def entries(self) -> dict[str, CacheEntry]:
+        """All cached pages of the round by URL, read from the round file on first use."""
+        if self._entries is None:
+            self._entries = dict()
+            if os.path.exists(self.file_name):
+                try:
+                    with stage('cache.read'):
+                        self._entries, self._buffer = read_round_file(self.file_name)
+                except RoundFileError as e:
+                    print('Warning: ignoring unreadable round cache', e)
+        return self._entries
+
+    def load_page(self, url: str) -> CacheEntry | None:
+        return self.entries.get(url)
+
+    def save_page(self, entry: CacheEntry):
+        entry.data = as_stored(entry.data)
+        self.entries[entry.url] = entry
+        self._dirty = True
+
+    def flush(self):
+        """Write the round file if pages were added or changed."""
+        if not self._dirty:
+            return
+        # Let go of the old file before replacing it
+        self._entries = {url: CacheEntry(entry.url, in_memory(entry.data), entry.etag, entry.last_modified, entry.sha256)
+                         for url, entry in self.entries.items()}
+        self.close()
+        with stage('cache.write'):
+            write_round_file(self.file_name, self._entries)
+        self._dirty = False
+
+    def close(self):
+        if self._buffer is not None:
+            try:
+                self._buffer.close()
+            except BufferError:
+                pass    # Pages of the round are still in use, the mapping goes when they do
+            self._buffer = None
+
+    def count(self, counter: str):
+        setattr(self.counters, counter, getattr(self.counters, counter) + 1)
+        setattr(run_counters, counter, getattr(run_counters, counter) + 1)
+
+    def get(self, urls: dict[str, str], parse: Callable[[str, Any], Any], fetcher, revalidate: bool) -> dict[str, Any]:
+        """
+        The parsed contents of a dict of {name: url}, served from disk where possible.
+
+        Pages that are not cached yet are fetched. With `revalidate`, cached pages are fetched with a
+        conditional GET and only parsed again when they changed. If a request fails the cached copy is
+        used regardless. Pages that can't be loaded at all are left out of the result.
+        """
+        cached = {name: self.load_page(url) for name, url in urls.items()}
+        to_fetch = {name: url for name, url in urls.items() if cached[name] is None or revalidate}
+        headers = {name: cached[name].conditional_headers() for name in to_fetch if cached[name]}
+        responses = fetcher.fetch_all(to_fetch, headers) if to_fetch else dict()
+
+        result = dict()
+        self.last_changed = set()
+        for name, url in urls.items():
+            entry = cached[name]
+            if name not in responses:
+                self.count('hits')
+            else:
+                response = responses[name]
+                if entry and response is not None and response.status_code == 304:
+                    self.count('revalidated')
+                elif response is not None and response.status_code == 200:
+                    if self.archive_pages:
+                        # Pages cached under several fragments of their URL, like the Top 100 table, are archived once
+                        self.archive.add(urldefrag(url).url, response)
+                    fresh = entry_from_response(url, response, None)
+                    if entry and entry.sha256 == fresh.sha256:
+                        # Server ignored the validators, but the page did not change
+                        self.count('revalidated')
+                        fresh.data = entry.data
+                    else:
+                        self.count('changed' if entry else 'misses')
+                        self.last_changed.add(name)
+                        fresh.data = parse(name, response)
+                    self.save_page(fresh)
+                    entry = fresh
+                elif entry:
+                    print('Warning: could not revalidate page, using cached copy of', url)
+                    self.count('stale')
+                else:
+                    print("Warning: could not load page", url)
+                    continue
+            result[name] = url
+        cached = entry = None
+        self.flush()
+        return {name: self.entries[url].data for name, url in result.items()}
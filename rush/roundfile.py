@@ -0,0 +1,269 @@
+"""
+Binary file format of the round cache.
+
+One file per round holds the cached pages of that round: the stat index, the stat pages and the
+full tables of pages that need more than their rankings, each with the URL and validators of the
+response it came from. Names and URLs are stored once in a shared string table; ranks and scores
+are stored as fixed-width little-endian columns. Files are read through mmap and a stat page's
+columns are only touched when that page is used, so loading a few stats of a round does not read
+the rest. Nothing in the file is executed on load.
+
+    header      magic 'ODRC', version, number of strings and entries, table offsets
+    columns     per entry, 8-byte aligned u32 string ids / i32 ranks / i64 scores
+    strings     u32 offsets[n + 1], followed by the UTF-8 bytes of all strings
+    directory   one fixed-size record per entry, see ENTRY
+"""
+import mmap
+import os
+import struct
+from collections.abc import Mapping, Sequence, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+MAGIC = b'ODRC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIQQ')
+# kind, rows, url, etag, last-modified, sha256, three column offsets
+ENTRY = struct.Struct('<BxxxIIII32s3Q')
+NO_STRING = 0xFFFFFFFF
+
+KIND_LINKS = 1      # {link text: URL}, the stat index of a round
+KIND_RANKINGS = 2   # {player name: Ranking}, a stat page
+KIND_TABLE = 3      # All text cells of the table of a page, row by row. The second column offset holds the width.
+
+
+class RoundFileError(ValueError):
+    pass
+
+
+@dataclass
+class CacheEntry:
+    """A cached page: where it came from, its HTTP validators and its parsed contents."""
+    url: str
+    data: Any
+    etag: str | None = None
+    last_modified: str | None = None
+    sha256: str | None = None
+
+    def conditional_headers(self) -> dict:
+        headers = dict()
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class StringColumn(Sequence):
+    """Strings of a column, decoded from the string table on access."""
+
+    def __init__(self, ids: np.ndarray, strings: 'StringTable'):
+        self.ids = ids
+        self.strings = strings
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.strings[sid] for sid in self.ids[i].tolist()]
+        return self.strings[int(self.ids[i])]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.strings[sid] for sid in self.ids.tolist())
+
+
+class StringTable:
+    def __init__(self, buffer, offset: int, count: int):
+        self.offsets = np.frombuffer(buffer, dtype='<u4', count=count + 1, offset=offset)
+        self.base = offset + (count + 1) * 4
+        self.buffer = buffer
+        if count and self.base + int(self.offsets[-1]) > len(buffer):
+            raise RoundFileError('String table runs past the end of the file')
+
+    def __getitem__(self, sid: int) -> str | None:
+        if sid == NO_STRING:
+            return None
+        start, end = int(self.offsets[sid]), int(self.offsets[sid + 1])
+        return bytes(self.buffer[self.base + start:self.base + end]).decode('utf-8')
+
+
+class StatColumns(Mapping):
+    """The rankings of a stat page as columns in page order, readable as {player name: Ranking}."""
+
+    def __init__(self, players: Sequence[str], rank: np.ndarray, score: np.ndarray):
+        self.players = players
+        self.rank = rank
+        self.score = score
+        self._index = None
+
+    @classmethod
+    def from_rankings(cls, rankings: dict) -> 'StatColumns':
+        values = rankings.values()
+        return cls(list(rankings.keys()),
+                   np.fromiter((r.rank for r in values), dtype=np.int32, count=len(rankings)),
+                   np.fromiter((r.score for r in values), dtype=np.int64, count=len(rankings)))
+
+    def _position(self, player_name: str) -> int | None:
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self.players)}
+        return self._index.get(player_name)
+
+    def __getitem__(self, player_name: str):
+        from rush.rankingscraper import Ranking
+        i = self._position(player_name)
+        if i is None:
+            raise KeyError(player_name)
+        return Ranking(self.rank[i].item(), player_name, self.score[i].item())
+
+    def __contains__(self, player_name) -> bool:
+        return self._position(player_name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.players)
+
+    def __len__(self) -> int:
+        return len(self.rank)
+
+
+class TableRows(Sequence):
+    """The rows of a table as lists of cell texts, for pages where more than the rankings are needed."""
+
+    def __init__(self, cells: Sequence[str], columns: int):
+        self.cells = cells
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows: list[list[str]]) -> 'TableRows':
+        columns = len(rows[0]) if rows else 0
+        if any(len(row) != columns for row in rows):
+            raise ValueError('Table rows differ in length')
+        return cls([cell for row in rows for cell in row], columns)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.cells[i * self.columns:(i + 1) * self.columns]
+
+    def __len__(self) -> int:
+        return len(self.cells) // self.columns if self.columns else 0
+
+
+def in_memory(data):
+    """Copy of page data that no longer refers to the mmap of a round file."""
+    if isinstance(data, StatColumns):
+        return StatColumns(list(data.players), np.array(data.rank), np.array(data.score))
+    if isinstance(data, TableRows):
+        return TableRows(list(data.cells), data.columns)
+    return data
+
+
+def as_stored(data):
+    """The form in which parsed page data is kept in the cache."""
+    if isinstance(data, (StatColumns, TableRows)):
+        return data
+    if isinstance(data, dict) and all(isinstance(v, str) for v in data.values()):
+        return data
+    return StatColumns.from_rankings(data)
+
+
+def read_round_file(file_name: str) -> tuple[dict[str, CacheEntry], mmap.mmap]:
+    """All entries of a round file by URL. Their columns are views on the returned mmap."""
+    buffer = None
+    try:
+        with open(file_name, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return _read_entries(buffer), buffer
+    except (struct.error, ValueError, IndexError, UnicodeDecodeError) as e:
+        if buffer is not None:
+            buffer.close()
+        raise RoundFileError(f'{file_name}: {e}')
+
+
+def _read_entries(buffer) -> dict[str, CacheEntry]:
+    magic, version, _, string_count, entry_count, strings_offset, directory_offset = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise RoundFileError('Not a round file')
+    if version != VERSION:
+        raise RoundFileError(f'Unsupported round file version {version}')
+    strings = StringTable(buffer, strings_offset, string_count)
+
+    entries = dict()
+    for i in range(entry_count):
+        kind, rows, url, etag, last_modified, sha256, *offsets = ENTRY.unpack_from(buffer, directory_offset + i * ENTRY.size)
+        if kind == KIND_LINKS:
+            names = np.frombuffer(buffer, dtype='<u4', count=rows, offset=offsets[0])
+            urls = np.frombuffer(buffer, dtype='<u4', count=rows, offset=offsets[1])
+            data = {strings[name]: strings[link] for name, link in zip(names.tolist(), urls.tolist())}
+        elif kind == KIND_RANKINGS:
+            data = StatColumns(StringColumn(np.frombuffer(buffer, dtype='<u4', count=rows, offset=offsets[0]), strings),
+                               np.frombuffer(buffer, dtype='<i4', count=rows, offset=offsets[1]),
+                               np.frombuffer(buffer, dtype='<i8', count=rows, offset=offsets[2]))
+        elif kind == KIND_TABLE:
+            columns = offsets[1]
+            data = TableRows(StringColumn(np.frombuffer(buffer, dtype='<u4', count=rows * columns, offset=offsets[0]),
+                                          strings), columns)
+        else:
+            raise RoundFileError(f'Unknown entry kind {kind}')
+        entries[strings[url]] = CacheEntry(strings[url], data, strings[etag], strings[last_modified],
+                                           sha256.hex() if any(sha256) else None)
+    return entries
+
+
+def write_round_file(file_name: str, entries: dict[str, CacheEntry]):
+    """Write all entries to a new round file, replacing the old one in one go."""
+    string_ids = dict()
+
+    def sid(value: str | None) -> int:
+        if value is None:
+            return NO_STRING
+        return string_ids.setdefault(value, len(string_ids))
+
+    body = bytearray(HEADER.size)
+
+    def column(values: np.ndarray) -> int:
+        body.extend(b'\0' * (-len(body) % 8))
+        offset = len(body)
+        body.extend(values.tobytes())
+        return offset
+
+    records = list()
+    for entry in entries.values():
+        data = as_stored(entry.data)
+        if isinstance(data, StatColumns):
+            kind, rows = KIND_RANKINGS, len(data)
+            offsets = (column(np.array([sid(name) for name in data.players], dtype='<u4')),
+                       column(np.asarray(data.rank, dtype='<i4')),
+                       column(np.asarray(data.score, dtype='<i8')))
+        elif isinstance(data, TableRows):
+            kind, rows = KIND_TABLE, len(data)
+            offsets = (column(np.array([sid(cell) for cell in data.cells], dtype='<u4')), data.columns, 0)
+        else:
+            kind, rows = KIND_LINKS, len(data)
+            offsets = (column(np.array([sid(name) for name in data.keys()], dtype='<u4')),
+                       column(np.array([sid(url) for url in data.values()], dtype='<u4')),
+                       0)
+        sha256 = bytes.fromhex(entry.sha256) if entry.sha256 else bytes(32)
+        records.append(ENTRY.pack(kind, rows, sid(entry.url), sid(entry.etag), sid(entry.last_modified), sha256, *offsets))
+
+    encoded = [value.encode('utf-8') for value in string_ids]
+    string_offsets = np.cumsum([0] + [len(value) for value in encoded], dtype='<u4')
+    body.extend(b'\0' * (-len(body) % 8))
+    strings_offset = len(body)
+    body.extend(string_offsets.astype('<u4').tobytes())
+    body.extend(b''.join(encoded))
+    body.extend(b'\0' * (-len(body) % 8))
+    directory_offset = len(body)
+    body.extend(b''.join(records))
+    HEADER.pack_into(body, 0, MAGIC, VERSION, 0, len(encoded), len(records), strings_offset, directory_offset)
+
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+    with open(file_name + '.tmp', 'wb') as f:
+        f.write(body)
+    os.replace(file_name + '.tmp', file_name)
@@ -0,0 +1,190 @@
+"""
+Columnar store for all the rankings of a round.
+
+Players and stats are interned to indices, and rank, raw score and scaled score are held in dense
+(stat x player) NumPy arrays with a mask telling which player appears in which stat. Mapping views
+keep the dict-of-dicts interface of the scraper working, so `stats[stat][player].fs_score` reads
+(and writes) straight from the arrays.
+"""
+import hashlib
+from collections.abc import Mapping, Iterator
+
+import numpy as np
+
+from rush.roundfile import StatColumns
+
+
+class RankingView:
+    """A single ranking, backed by the arrays of its RoundStats."""
+    __slots__ = ('_stats', '_stat', '_player')
+
+    def __init__(self, stats: 'RoundStats', stat: int, player: int):
+        self._stats = stats
+        self._stat = stat
+        self._player = player
+
+    @property
+    def rank(self) -> int:
+        return self._stats.rank[self._stat, self._player].item()
+
+    @property
+    def player(self) -> str:
+        return self._stats.player_names[self._player]
+
+    @property
+    def score(self) -> int:
+        return self._stats.score[self._stat, self._player].item()
+
+    @property
+    def fs_score(self) -> float:
+        return self._stats.fs_score[self._stat, self._player].item()
+
+    @fs_score.setter
+    def fs_score(self, value: float):
+        self._stats.fs_score[self._stat, self._player] = value
+
+    def __repr__(self):
+        return f'RankingView(rank={self.rank}, player={self.player!r}, score={self.score}, fs_score={self.fs_score})'
+
+
+class StatView(Mapping):
+    """The rankings of one stat as {player name: RankingView}, in the order of the stat page."""
+
+    def __init__(self, stats: 'RoundStats', stat: int):
+        self._stats = stats
+        self._stat = stat
+
+    def __getitem__(self, player_name: str) -> RankingView:
+        player = self._stats.player_index.get(player_name)
+        if player is None or not self._stats.present[self._stat, player]:
+            raise KeyError(player_name)
+        return RankingView(self._stats, self._stat, player)
+
+    def __contains__(self, player_name) -> bool:
+        player = self._stats.player_index.get(player_name)
+        return player is not None and bool(self._stats.present[self._stat, player])
+
+    def __iter__(self) -> Iterator[str]:
+        names = self._stats.player_names
+        return (names[player] for player in self._stats.order[self._stat].tolist())
+
+    def __len__(self) -> int:
+        return len(self._stats.order[self._stat])
+
+
+class RoundStats(Mapping):
+    """All rankings of a round as {stat name: StatView}."""
+
+    def __init__(self, stat_names: list[str], player_names: list[str], order: list[np.ndarray],
+                 rank: np.ndarray, score: np.ndarray, fs_score: np.ndarray):
+        self.stat_names = stat_names
+        self.player_names = player_names
+        self.stat_index = {name: i for i, name in enumerate(stat_names)}
+        self.player_index = {name: i for i, name in enumerate(player_names)}
+        # Player indices of every stat in page order
+        self.order = order
+        self.rank = rank
+        self.score = score
+        self.fs_score = fs_score
+        self.present = np.zeros(rank.shape, dtype=bool)
+        for stat, players in enumerate(order):
+            self.present[stat, players] = True
+        self._page_order = None
+
+    @classmethod
+    def from_rankings(cls, rankings: dict) -> 'RoundStats':
+        """Build from a dict{stat name: dict{player name: Ranking}}."""
+        stats = cls([], [], [], np.zeros((0, 0), dtype=np.int32), np.zeros((0, 0), dtype=np.int64),
+                    np.zeros((0, 0), dtype=np.float64))
+        stats.update(rankings)
+        return stats
+
+    def update(self, rankings: dict):
+        """
+        Replace the rankings of some stats in place with a dict{stat name: dict{player name: Ranking}}.
+        Stats and players that are new to the round are added. Scaled scores of the replaced stats are
+        taken from the Rankings, so they need scaling again.
+        """
+        self._page_order = None
+        new_stats = [name for name in rankings if name not in self.stat_index]
+        new_players = list(dict.fromkeys(name for stat_rankings in rankings.values() for name in stat_rankings
+                                         if name not in self.player_index))
+        if new_stats or new_players:
+            padding = ((0, len(new_stats)), (0, len(new_players)))
+            self.rank = np.pad(self.rank, padding)
+            self.score = np.pad(self.score, padding)
+            self.fs_score = np.pad(self.fs_score, padding)
+            self.present = np.pad(self.present, padding)
+            for name in new_stats:
+                self.stat_index[name] = len(self.stat_names)
+                self.stat_names.append(name)
+                self.order.append(np.zeros(0, dtype=np.int32))
+            for name in new_players:
+                self.player_index[name] = len(self.player_names)
+                self.player_names.append(name)
+
+        for stat_name, stat_rankings in rankings.items():
+            stat = self.stat_index[stat_name]
+            players = np.fromiter((self.player_index[name] for name in stat_rankings), dtype=np.int32, count=len(stat_rankings))
+            for array in (self.rank, self.score, self.fs_score, self.present):
+                array[stat] = 0
+            if isinstance(stat_rankings, StatColumns):
+                # Straight from the round cache, no Rankings to unpack
+                self.rank[stat, players] = stat_rankings.rank
+                self.score[stat, players] = stat_rankings.score
+            else:
+                values = stat_rankings.values()
+                self.rank[stat, players] = np.fromiter((r.rank for r in values), dtype=np.int32, count=len(players))
+                self.score[stat, players] = np.fromiter((r.score for r in values), dtype=np.int64, count=len(players))
+                self.fs_score[stat, players] = np.fromiter((r.fs_score for r in values), dtype=np.float64, count=len(players))
+            self.present[stat, players] = True
+            self.order[stat] = players
+
+    def subset(self, stat_filter) -> 'RoundStats':
+        """
+        A copy with only the stats that pass the filter and the players in them, the same as a load of the
+        round with that filter. Scaled scores are copied, so they need scaling again for other methods.
+        """
+        stats = [stat for stat, name in enumerate(self.stat_names) if stat_filter(name)]
+        players = list(dict.fromkeys(player for stat in stats for player in self.order[stat].tolist()))
+        renumber = np.zeros(len(self.player_names), dtype=np.int32)
+        renumber[players] = np.arange(len(players), dtype=np.int32)
+        rows, columns = np.ix_(np.array(stats, dtype=np.intp), np.array(players, dtype=np.intp))
+        return RoundStats([self.stat_names[stat] for stat in stats], [self.player_names[player] for player in players],
+                          [renumber[self.order[stat]] for stat in stats],
+                          self.rank[rows, columns], self.score[rows, columns], self.fs_score[rows, columns])
+
+    def players_in_page_order(self) -> list[str]:
+        """All players, in order of first appearance going through the stat pages. Kept until the next update."""
+        if self._page_order is None:
+            players = dict.fromkeys(player for stat_players in self.order for player in stat_players.tolist())
+            self._page_order = [self.player_names[player] for player in players]
+        return self._page_order
+
+    def __getitem__(self, stat_name: str) -> StatView:
+        return StatView(self, self.stat_index[stat_name])
+
+    def __contains__(self, stat_name) -> bool:
+        return stat_name in self.stat_index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.stat_names)
+
+    def __len__(self) -> int:
+        return len(self.stat_names)
+
+    def content_hash(self) -> str:
+        """Hash of the raw rankings: stats, players, ranks and scores. Scaled scores are left out."""
+        digest = hashlib.sha256()
+        digest.update('\0'.join(self.stat_names).encode())
+        digest.update('\0'.join(self.player_names).encode())
+        for stat, players in enumerate(self.order):
+            digest.update(players.tobytes())
+            digest.update(self.rank[stat, players].tobytes())
+            digest.update(self.score[stat, players].tobytes())
+        return digest.hexdigest()
+
+    @property
+    def nbytes(self) -> int:
+        arrays = self.rank.nbytes + self.score.nbytes + self.fs_score.nbytes + self.present.nbytes
+        return arrays + sum(players.nbytes for players in self.order)
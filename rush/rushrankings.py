@@ -22,8 +22,22 @@ __version__ = "1.0"
 
 import re
 import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import copy
 
-from rush.rankingscraper import load_stats, get_all_land_sizes
+import numpy as np
+
+from config import SCORING_WORKERS, LEADERBOARD_SIZE
+from rush import profiling
+from rush.fetcher import reset_default_fetcher
+from rush.profiling import stage, timed
+from rush.leaderboard import Leaderboards
+from rush.players import ScoreMatrix
+from rush.repository import repository
+from rush.resultstore import result_store
+from rush.roundcache import CacheCounters, run_counters
+from rush.roundstats import RoundStats
+from rush.scoringplan import ScoringPlan
 
 
 def is_blop_stat(stat_name: str) -> bool:
@@ -54,12 +68,14 @@ def is_dom_stat(stat_name: str) -> bool:
     return True
 
 
-def all_player_names(stats: dict) -> set:
-    players = set()
-    for stat in stats.values():
-        players.update(stat.keys())
-    players.discard("Bot")
-    return players
+def all_player_names(stats: dict) -> list:
+    """All players of the round, in order of first appearance."""
+    if isinstance(stats, RoundStats):
+        players = dict.fromkeys(stats.players_in_page_order())
+    else:
+        players = dict.fromkeys(name for stat in stats.values() for name in stat)
+    players.pop("Bot", None)
+    return list(players)
 
 
 def sanitize_name_for_csv(name: str) -> str:
@@ -115,27 +131,38 @@ def calculate_player_score(config: dict, stats: dict, name: str, land_sizes: dic
     return round(player_score, 3)
 
 
+def round_stats_for_config(config: dict, round_number: int) -> tuple[ScoringPlan, RoundStats]:
+    plan = ScoringPlan.compile(config)
+    return plan, repository.stats(round_number, stat_filter=is_dom_stat, scaling_methods=plan.scaling_methods)
+
+
+def stored_scores_for_round(config: dict, round_number: int) -> list | None:
+    """The stored scores of the round, if its config and stats did not change since they were calculated."""
+    plan, stats = round_stats_for_config(config, round_number)
+    return result_store.load(round_number, config, stats)
+
+
+@timed('blop_scores_for_round')
 def blop_scores_for_round(config: dict, round_number: int, with_categories=False) -> list:
     """Calculate the scores for all players in a specific round."""
-    # Build scaling methods dict from config
-    scaling_methods = {}
-    for category_name, category_config in config.items():
-        scaling_style = category_config.get('scaling_style', 'linear')
-        for stat_name in category_config['rankings']:
-            scaling_methods[stat_name] = scaling_style
+    plan, stats = round_stats_for_config(config, round_number)
+    scores = result_store.load(round_number, config, stats)
+    if scores is None:
+        players = all_player_names(stats)
 
-    stats = load_stats(round_number, stat_filter=is_dom_stat, scaling_methods=scaling_methods)
-    players = all_player_names(stats)
+        # Get land sizes for known players only
+        all_land_sizes = repository.land_sizes(round_number, stat_filter=is_dom_stat)
+        known_players = set(players)
+        land_sizes = {player: land for player, land in all_land_sizes.items()
+                      if player in known_players}
 
-    # Get land sizes for known players only
-    all_land_sizes = get_all_land_sizes(round_number, stat_filter=is_dom_stat)
-    land_sizes = {player: land for player, land in all_land_sizes.items()
-                  if player in players}
+        with stage('score'):
+            scores = plan.score(stats, players, land_sizes).as_list(with_categories=True)
+        result_store.save(round_number, config, stats, scores)
 
     if with_categories:
-        return [(player, calculate_player_score(config, stats, player, land_sizes), score_categories(config, stats, player, land_sizes)) for player in players]
-    else:
-        return [(player, calculate_player_score(config, stats, player, land_sizes)) for player in players]
+        return scores
+    return [(player, score) for player, score, categories in scores]
 
 
 def round_scores(config: dict, round_number: int, out_dir: str, with_categories=False):
@@ -143,10 +170,11 @@ def round_scores(config: dict, round_number: int, out_dir: str, with_categories=
     blop_scores = blop_scores_for_round(config, round_number, with_categories)
     top_blop = sorted(blop_scores, key=lambda e: e[1], reverse=True)
 
-    # Get land sizes for all players
-    all_land_sizes = get_all_land_sizes(round_number)
+    # Get land sizes for all players, from the same load as the scores
+    all_land_sizes = repository.land_sizes(round_number, stat_filter=is_dom_stat)
 
-    with open(f'{out_dir}/Top (Black) Oppers Round {round_number}{" (Cats)" if with_categories else ""}.txt', 'w') as f:
+    file_name = f'{out_dir}/Top (Black) Oppers Round {round_number}{" (Cats)" if with_categories else ""}.txt'
+    with stage('write'), open(file_name, 'w') as f:
         if with_categories:
             print(top_blop[0][2].keys())
             print([config[c]['weight'] for c in top_blop[0][2].keys()])
@@ -159,27 +187,17 @@ def round_scores(config: dict, round_number: int, out_dir: str, with_categories=
             else:
                 f.write(f"{sanitized_name}, {land_size}, {p[1]}\n")
 
+    if with_categories:
+        write_leaderboards(Leaderboards.from_scores(blop_scores, LEADERBOARD_SIZE), round_number, out_dir)
 
-class Player:
-    def __init__(self, name: str, round_numbers: list):
-        self.name = name
-        self.round_scores = {nr: 0 for nr in round_numbers}
-
-    def add_round_score(self, nr, score):
-        self.round_scores[nr] = score
-
-    @property
-    def total_score(self):
-        return round(sum(self.round_scores.values()), 3)
-
-    @property
-    def average_score(self):
-        return round(self.total_score / len(self.round_scores), 3)
 
-    def scores_text(self):
-        nrs = sorted(self.round_scores.keys(), reverse=True)
-        sorted_scores = [str(round(self.round_scores[nr], 3)) for nr in nrs]
-        return ','.join(sorted_scores)
+def write_leaderboards(leaderboards: Leaderboards, round_number: int, out_dir: str):
+    """The top players of the round, overall and per category."""
+    with stage('write'), open(f'{out_dir}/Leaderboards Round {round_number}.txt', 'w') as f:
+        for board in leaderboards.boards:
+            f.write(f"== {board} ==\n")
+            for rank, (player, score) in enumerate(leaderboards.top(board), start=1):
+                f.write(f"{rank}, {sanitize_name_for_csv(player)}, {round(score, 3)}\n")
 
 
 def apply_low_land_penalty(score: float, player_land: float, min_land: float, max_land: float, max_penalty: float = 0.5, threshold: float = None) -> float:
@@ -230,19 +248,67 @@ def apply_low_land_penalty(score: float, player_land: float, min_land: float, ma
     return score * multiplier
 
 
-def multiple_round_scores(config_versions_per_round: dict, round_numbers: list | tuple, out_dir: str):
-    player_scores = dict()
-    for nr in round_numbers:
-        print(f'== ROUND {nr} ==')
-        blop_scores = blop_scores_for_round(config_versions_per_round[nr], nr)
-        for player, score in blop_scores:
-            if player not in player_scores:
-                player_scores[player] = Player(player, round_numbers)
-            player_scores[player].add_round_score(nr, score)
-    top_blop_sorted = sorted(player_scores.values(), key=lambda e: e.total_score, reverse=True)
+def _score_round_in_worker(config: dict, round_number: int, profile: bool) -> tuple[list, bool, CacheCounters, dict | None]:
+    """
+    Process pool task: the round scores, whether they were stored already, plus the page cache counters
+    and the profile of this round. The round is loaded here, in the worker, also when its scores are stored.
+    """
+    profiling.start_task(profile)
+    before = copy(run_counters)
+    stored = stored_scores_for_round(config, round_number)
+    if stored is not None:
+        blop_scores = [(player, score) for player, score, categories in stored]
+    else:
+        blop_scores = blop_scores_for_round(config, round_number)
+    return blop_scores, stored is not None, run_counters.since(before), profiling.finish_task()
+
 
-    with open(f'{out_dir}/R{round_numbers[0]} Last {len(round_numbers)} Rounds - full.txt', 'w') as f:
-        for player in top_blop_sorted:
-            sanitized_name = sanitize_name_for_csv(player.name)
-            f.write(f"{sanitized_name},{player.total_score},{player.average_score},{player.scores_text()}\n")
+def scores_per_round(config_versions_per_round: dict, round_numbers: list | tuple, workers: int = SCORING_WORKERS) -> dict:
+    """Score a series of rounds, in a pool of worker processes if `workers` > 1. Returns {round: scores} in round order."""
+    if workers <= 1 or len(round_numbers) <= 1:
+        result = dict()
+        for nr in round_numbers:
+            print(f'== ROUND {nr} ==')
+            result[nr] = blop_scores_for_round(config_versions_per_round[nr], nr)
+        return result
 
+    result = dict()
+    unchanged = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(round_numbers)), initializer=reset_default_fetcher) as pool:
+        futures = {pool.submit(_score_round_in_worker, config_versions_per_round[nr], nr, profiling.enabled()): nr
+                   for nr in round_numbers}
+        for future in as_completed(futures):
+            nr = futures[future]
+            result[nr], stored, counters, profile = future.result()
+            unchanged += stored
+            run_counters.add(counters)
+            profiling.merge(profile)
+            print(f'== ROUND {nr} == {"unchanged" if stored else "done"} ({len(result)}/{len(round_numbers)})')
+    if unchanged:
+        print(f'{unchanged}/{len(round_numbers)} rounds unchanged')
+    # Merge in round order, so the result does not depend on which worker finished first
+    return {nr: result[nr] for nr in round_numbers}
+
+
+def multiple_round_standings(scores_by_round: dict) -> list[tuple[str, float, float, dict[int, float]]]:
+    """(player, total, average, {round: score}) of everyone, best total first, from {round: [(player, score)]}."""
+    matrix = ScoreMatrix.from_rounds(scores_by_round)
+    totals = [round(total, 3) for total in matrix.totals().tolist()]
+    averages = [round(total / len(matrix.round_numbers), 3) for total in totals]
+    names = matrix.names()
+    scores = matrix.scores.tolist()
+    present = matrix.present.tolist()
+    return [(names[row], totals[row], averages[row],
+             {nr: round(scores[row][column], 3) for column, nr in enumerate(matrix.round_numbers) if present[row][column]})
+            for row in np.argsort(-np.array(totals), kind='stable').tolist()]
+
+
+def multiple_round_scores(config_versions_per_round: dict, round_numbers: list | tuple, out_dir: str,
+                          workers: int = SCORING_WORKERS):
+    standings = multiple_round_standings(scores_per_round(config_versions_per_round, round_numbers, workers))
+    newest_first = sorted(round_numbers, reverse=True)
+
+    with stage('write'), open(f'{out_dir}/R{round_numbers[0]} Last {len(round_numbers)} Rounds - full.txt', 'w') as f:
+        for name, total, average, player_rounds in standings:
+            scores_text = ','.join(str(player_rounds[nr]) if nr in player_rounds else '0' for nr in newest_first)
+            f.write(f"{sanitize_name_for_csv(name)},{total},{average},{scores_text}\n")
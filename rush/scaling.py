@@ -0,0 +1,86 @@
+"""
+Feature scaling of ranking scores, a whole stat column at a time.
+
+Scaling styles are registered by name, matching the 'scaling_style' of a category in the
+rush_rankings_v*.json configs. A style gets the scores of a column shifted down by the column
+minimum, the column span (max - min) and the target range, and returns the scaled scores.
+Columns where every player has the same score always scale to 1.
+"""
+import math
+from typing import Callable
+
+import numpy as np
+
+DEFAULT_STYLE = 'linear'
+
+ScalingStyle = Callable[[np.ndarray, int, float, float], np.ndarray]
+SCALING_STYLES: dict[str, ScalingStyle] = dict()
+
+# NumPy's vectorized log and pow can differ from the C library in the last bit. The scaled scores
+# must stay identical to the per-Ranking formulas, so those go elementwise through the same functions.
+_log = np.frompyfunc(math.log, 1, 1)
+_pow = np.frompyfunc(pow, 2, 1)
+
+
+def exact_log(values: np.ndarray) -> np.ndarray:
+    return np.asarray(_log(np.asarray(values).astype(object)), dtype=np.float64)
+
+
+def exact_pow(values: np.ndarray, exponent: float) -> np.ndarray:
+    return np.asarray(_pow(np.asarray(values).astype(object), exponent), dtype=np.float64)
+
+
+def scaling_style(name: str) -> Callable[[ScalingStyle], ScalingStyle]:
+    """Decorator to register a scaling style under the name used in the scoring configs."""
+    def register(style: ScalingStyle) -> ScalingStyle:
+        SCALING_STYLES[name] = style
+        return style
+    return register
+
+
+def get_scaling_style(name: str) -> ScalingStyle:
+    # Unknown styles have always been scaled linearly
+    return SCALING_STYLES.get(name, SCALING_STYLES[DEFAULT_STYLE])
+
+
+@scaling_style('linear')
+def linear(shifted: np.ndarray, span: int, low, high) -> np.ndarray:
+    return low + (shifted * (high - low)) / span
+
+
+@scaling_style('log')
+def log(shifted: np.ndarray, span: int, low, high) -> np.ndarray:
+    """Log scaling with diminishing returns - compresses top outliers. log(1 + score) handles zero scores."""
+    return low + (exact_log(1 + shifted) * (high - low)) / exact_log(1 + span)
+
+
+@scaling_style('power')
+def power(shifted: np.ndarray, span: int, low, high) -> np.ndarray:
+    """Square of the linear scale - penalizes low scores more, rewards normal-high scores."""
+    return low + exact_pow(shifted / span, 2) * (high - low)
+
+
+@scaling_style('logpower')
+def logpower(shifted: np.ndarray, span: int, low, high) -> np.ndarray:
+    """Log to compress top outliers, then power to separate mid/low."""
+    return low + exact_pow(exact_log(1 + shifted) / exact_log(1 + span), 1.5) * (high - low)
+
+
+def scale_column(scores: np.ndarray, method: str = DEFAULT_STYLE, low=0, high=1) -> np.ndarray:
+    """Scale a column of scores from `low` (lowest score) to `high` (highest score)."""
+    scores = np.asarray(scores, dtype=np.int64)
+    min_score = scores.min()
+    span = scores.max() - min_score
+    if span <= 0:
+        return np.ones(len(scores))
+    return get_scaling_style(method)(scores - min_score, span, low, high)
+
+
+def scale_round(stats, methods: dict[str, str] = None, low=0, high=1, stat_names: list[str] = None):
+    """Scale every stat (or only `stat_names`) of a RoundStats, writing the scaled scores of the players present in it."""
+    methods = methods or dict()
+    for stat_name in stat_names if stat_names is not None else stats.stat_names:
+        stat = stats.stat_index[stat_name]
+        players = stats.order[stat]
+        method = methods.get(stat_name, DEFAULT_STYLE)
+        stats.fs_score[stat, players] = scale_column(stats.score[stat, players], method, low, high)
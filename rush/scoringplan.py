@@ -0,0 +1,145 @@
+"""
+Compiled form of a Rush Rankings scoring config.
+
+A ScoringPlan parses a rush_rankings_v*.json config once: the calculation of every category, its
+weight and its small-land penalty settings. Scoring a round then resolves the stats of each
+category to rows of the RoundStats and scores the categories and totals of all players at once.
+The arithmetic follows score_categories and apply_low_land_penalty step by step, so the results
+are the same as scoring every player separately.
+"""
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from rush.roundstats import RoundStats
+from rush.scaling import exact_pow, DEFAULT_STYLE
+
+BEST_OF_PATTERN = re.compile(r'average of best (\d+)')
+
+
+@dataclass
+class CategoryPlan:
+    name: str
+    rankings: list[str]
+    weight: float
+    best: int | None = None     # Average of the best N rankings, or None to average all of them
+    max_penalty: float = 0
+    penalty_threshold: float | None = None
+    scaling_style: str = DEFAULT_STYLE
+
+    @classmethod
+    def compile(cls, name: str, score_category: dict) -> 'CategoryPlan':
+        calculation = score_category['calculation']
+        if calculation == 'average':
+            best = None
+        elif match := BEST_OF_PATTERN.fullmatch(calculation):
+            best = int(match.group(1))
+        else:
+            raise Exception(f"Unknown calculation method: {calculation}")
+        return cls(name,
+                   list(score_category['rankings']),
+                   score_category['weight'],
+                   best,
+                   score_category.get('small_land_max_penalty', 0),
+                   score_category.get('small_land_penalty_threshold', None),
+                   score_category.get('scaling_style', DEFAULT_STYLE))
+
+    def score(self, stats: RoundStats, players: np.ndarray) -> np.ndarray:
+        """Unpenalized category score of the given player indices."""
+        rows = [stats.stat_index[stat_name] for stat_name in self.rankings]
+        # Players that are not ranked in a stat have a scaled score of 0, so they add nothing.
+        return self.combine(stats.fs_score[np.ix_(rows, players)])
+
+    def combine(self, fs_scores: np.ndarray) -> np.ndarray:
+        """Unpenalized category score from the (ranking x player) scaled scores of its rankings."""
+        total = 0
+        if self.best is None:
+            for row in fs_scores:
+                total = total + row
+            return total / len(self.rankings) * self.weight
+        best_scores = -np.sort(-fs_scores, axis=0)
+        for row in best_scores[:self.best]:
+            total = total + row
+        return total / self.best * self.weight
+
+    def apply_penalty(self, scores: np.ndarray, land: np.ndarray, has_land: np.ndarray, min_land, max_land) -> np.ndarray:
+        """Vectorized apply_low_land_penalty for the players that have a land size."""
+        effective_max = self.penalty_threshold if self.penalty_threshold is not None else max_land
+        penalized = has_land & (land < effective_max)
+        if not penalized.any():
+            return scores
+        if effective_max < min_land:
+            raise ValueError(f"effective_max ({effective_max}) must be >= min_land ({min_land})")
+        if effective_max == min_land:
+            raise ValueError(f"effective_max equals min_land ({effective_max}) - invalid land data")
+
+        land_ratio = (land[penalized] - min_land) / (effective_max - min_land)
+        multiplier = 1.0 - self.max_penalty * (1 - exact_pow(land_ratio, 0.5))
+        scores = scores.copy()
+        scores[penalized] = scores[penalized] * multiplier
+        return scores
+
+
+def land_arrays(players: list[str], land_sizes: dict = None) -> tuple[np.ndarray, np.ndarray, int | None, int | None]:
+    """Land size per player, whether it is known, and the smallest and largest land of the round."""
+    land = np.zeros(len(players), dtype=np.int64)
+    has_land = np.zeros(len(players), dtype=bool)
+    if not land_sizes:
+        return land, has_land, None, None
+    for i, name in enumerate(players):
+        if name in land_sizes:
+            land[i] = land_sizes[name]
+            has_land[i] = True
+    return land, has_land, min(land_sizes.values()), max(land_sizes.values())
+
+
+@dataclass
+class RoundScores:
+    """Category scores and totals of all scored players of a round."""
+    players: list[str]
+    category_names: list[str]
+    category_scores: np.ndarray     # (player x category)
+    totals: list[float]             # Rounded to 3 decimals
+
+    def as_list(self, with_categories=False) -> list:
+        """The [(player, total score[, {category: score}])] format of blop_scores_for_round."""
+        if not with_categories:
+            return list(zip(self.players, self.totals))
+        return [(player, total, dict(zip(self.category_names, scores)))
+                for player, total, scores in zip(self.players, self.totals, self.category_scores.tolist())]
+
+
+@dataclass
+class ScoringPlan:
+    categories: list[CategoryPlan]
+
+    @classmethod
+    def compile(cls, config: dict) -> 'ScoringPlan':
+        return cls([CategoryPlan.compile(name, score_category) for name, score_category in config.items()])
+
+    @property
+    def scaling_methods(self) -> dict[str, str]:
+        """Scaling style per stat, as load_stats expects it."""
+        return {stat_name: category.scaling_style for category in self.categories for stat_name in category.rankings}
+
+    def score(self, stats: RoundStats, players: list[str], land_sizes: dict = None) -> RoundScores:
+        """Score all categories and the total of the given players in one pass."""
+        if not isinstance(stats, RoundStats):
+            stats = RoundStats.from_rankings(stats)
+        player_indices = np.array([stats.player_index[name] for name in players], dtype=np.intp)
+        land, has_land, min_land, max_land = land_arrays(players, land_sizes)
+
+        columns = list()
+        for category in self.categories:
+            scores = category.score(stats, player_indices)
+            if land_sizes and category.max_penalty > 0:
+                scores = category.apply_penalty(scores, land, has_land, min_land, max_land)
+            columns.append(np.broadcast_to(np.asarray(scores, dtype=np.float64), (len(players),)))
+
+        category_scores = np.stack(columns, axis=1) if columns else np.zeros((len(players), 0))
+        total = 0
+        for column in columns:
+            total = total + column
+        totals = [round(score, 3) for score in np.broadcast_to(np.asarray(total, dtype=np.float64), (len(players),)).tolist()]
+        return RoundScores(list(players), [category.name for category in self.categories], category_scores, totals)
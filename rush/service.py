@@ -0,0 +1,248 @@
+"""
+Local HTTP service with the leaderboards as JSON, kept warm in memory.
+
+All rounds are scored once at startup and every response is serialized up front, so answering a
+request is a dictionary lookup. A background thread checks for changes every interval: live rounds
+are revalidated through the round cache, and the scoring config files are checked for edits. Only the
+rounds whose stats or config changed are scored again, after which their responses and the multi-round
+ones are rebuilt.
+
+    GET /rounds                         The rounds, their round number and config version
+    GET /round/<round>                  Standings of a round: land, total and category scores
+    GET /round/<round>/leaderboards     Top players of a round, overall and per category
+    GET /round/<round>/category/<name>  Standings of a round in one category
+    GET /last/<n>                       Totals and averages over the last n rounds
+    GET /lifetime                       Totals and averages over all rounds
+    GET /status                         When the results were last updated
+
+Responses carry an ETag, and a request with a matching If-None-Match gets a 304. A HEAD request gets the
+status and headers of a GET without the body.
+
+Run from the project root:  python -m rush.service [--port 8080] [--interval 60]
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote
+
+from config import ALL_BLOP_ROUNDS, ALL_ROUNDS, LIVE_ROUNDS, LEADERBOARD_SIZE, ROUND_NUMBERS, \
+    SCORING_WORKERS, SERVICE_PORT, SERVICE_REFRESH_INTERVAL, scoring_configs
+from rush.leaderboard import Leaderboards
+from rush.repository import repository
+from rush.rushrankings import is_dom_stat, blop_scores_for_round, scores_per_round, round_stats_for_config, \
+    multiple_round_standings
+
+LAST_N_PATH = re.compile(r'/last/(\d+)')
+
+
+@dataclass(frozen=True)
+class Payload:
+    body: bytes
+    etag: str
+
+
+def payload(data) -> Payload:
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return Payload(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+def round_payloads(round_number: int, scores: list) -> dict[str, Payload]:
+    """Responses of one round, from the [(player, total score, {category: score})] of blop_scores_for_round."""
+    land_sizes = repository.land_sizes(round_number, stat_filter=is_dom_stat)
+    standings = sorted(scores, key=lambda e: e[1], reverse=True)
+    categories = list(standings[0][2]) if standings else []
+    path = f'/round/{round_number}'
+    payloads = {path: payload(dict(round=round_number, categories=categories, standings=[
+        dict(rank=rank, player=player, land=land_sizes.get(player, 0), score=total, categories=category_scores)
+        for rank, (player, total, category_scores) in enumerate(standings, start=1)]))}
+
+    leaderboards = Leaderboards.from_scores(scores, LEADERBOARD_SIZE)
+    payloads[f'{path}/leaderboards'] = payload(dict(round=round_number, leaderboards={
+        board: [dict(rank=rank, player=player, score=round(score, 3))
+                for rank, (player, score) in enumerate(leaderboards.top(board), start=1)]
+        for board in leaderboards.boards}))
+
+    for category in categories:
+        by_category = sorted(scores, key=lambda e: e[2][category], reverse=True)
+        payloads[f'{path}/category/{category}'] = payload(dict(round=round_number, category=category, standings=[
+            dict(rank=rank, player=player, score=category_scores[category])
+            for rank, (player, total, category_scores) in enumerate(by_category, start=1)]))
+    return payloads
+
+
+def rounds_payload(scores: dict[int, list], round_numbers: list[int]) -> Payload:
+    """Totals over a series of rounds, ranked like the "Last N Rounds" reports."""
+    standings = multiple_round_standings({nr: [(player, total) for player, total, categories in scores[nr]]
+                                          for nr in round_numbers})
+    return payload(dict(rounds=list(round_numbers), standings=[
+        dict(rank=rank, player=player, total=total, average=average, rounds=player_rounds)
+        for rank, (player, total, average, player_rounds) in enumerate(standings, start=1)]))
+
+
+class WarmResults:
+    """Scores of all rounds and their serialized responses."""
+
+    def __init__(self, round_numbers: list[int] = ALL_ROUNDS, workers: int = SCORING_WORKERS):
+        self.round_numbers = list(round_numbers)
+        self.workers = workers
+        # Replaced together under the lock when something changed
+        self.keys = dict()          # {round: (config hash, stats hash)} of the current scores
+        self.scores = dict()        # {round: [(player, total score, {category: score})]}
+        self.round_payloads = dict()
+        self.payloads = dict()      # {path: Payload}
+        self.updated = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def round_key(round_number: int) -> tuple[str, str]:
+        config = ALL_BLOP_ROUNDS[round_number]
+        plan, stats = round_stats_for_config(config, round_number)
+        return scoring_configs.hash(config), stats.content_hash()
+
+    def score(self, round_number: int, keys: dict, scores: dict, payloads: dict):
+        """Score a round into the given dicts of {round: key}, {round: scores} and {round: responses}."""
+        keys[round_number] = self.round_key(round_number)
+        scores[round_number] = blop_scores_for_round(ALL_BLOP_ROUNDS[round_number], round_number, with_categories=True)
+        payloads[round_number] = round_payloads(round_number, scores[round_number])
+
+    def warm(self):
+        """Score every round, the rounds without stored results in worker processes."""
+        scores_per_round(ALL_BLOP_ROUNDS, self.round_numbers, self.workers)
+        keys, scores, payloads = dict(), dict(), dict()
+        for round_number in self.round_numbers:
+            self.score(round_number, keys, scores, payloads)
+        self.publish(keys, scores, payloads)
+
+    def refresh(self) -> list[int]:
+        """Score the rounds again whose stats or config changed. Returns those rounds."""
+        changed_versions = set(scoring_configs.refresh())
+        keys, scores, payloads = dict(self.keys), dict(self.scores), dict(self.round_payloads)
+        changed = list()
+        for round_number in self.round_numbers:
+            live = round_number in LIVE_ROUNDS
+            if not live and ALL_BLOP_ROUNDS.versions[round_number] not in changed_versions:
+                continue
+            if live:
+                repository.clear(round_number)
+            if self.round_key(round_number) != keys.get(round_number):
+                self.score(round_number, keys, scores, payloads)
+                changed.append(round_number)
+        if changed:
+            self.publish(keys, scores, payloads)
+        return changed
+
+    def publish(self, keys: dict, scores: dict, round_payloads: dict):
+        """Build the multi-round responses, and swap in the new scores and responses at once."""
+        payloads = {'/rounds': payload([dict(round=nr, number=ROUND_NUMBERS.get(nr),
+                                             config=ALL_BLOP_ROUNDS.versions[nr], players=len(scores[nr]))
+                                        for nr in self.round_numbers])}
+        for round_number in self.round_numbers:
+            payloads.update(round_payloads[round_number])
+        for n in (5, 10):
+            if n <= len(self.round_numbers):
+                payloads[f'/last/{n}'] = rounds_payload(scores, self.round_numbers[:n])
+        payloads['/lifetime'] = rounds_payload(scores, self.round_numbers)
+        updated = datetime.now()
+        payloads['/status'] = payload(dict(updated=updated.isoformat(timespec='seconds'),
+                                           rounds=len(self.round_numbers), live=list(LIVE_ROUNDS)))
+        with self.lock:
+            self.keys, self.scores, self.round_payloads = keys, scores, round_payloads
+            self.payloads = payloads
+            self.updated = updated
+
+    def get(self, path: str) -> Payload | None:
+        found = self.payloads.get(path)
+        if found is None and (match := LAST_N_PATH.fullmatch(path)):
+            n = int(match.group(1))
+            if 0 < n <= len(self.round_numbers):
+                # The scores and responses are swapped together under the lock, so they belong together here
+                with self.lock:
+                    found = self.payloads.get(path) or self.payloads.setdefault(
+                        path, rounds_payload(self.scores, self.round_numbers[:n]))
+        return found
+
+    def keep_fresh(self, interval: float, stop: threading.Event):
+        while not stop.wait(interval):
+            try:
+                changed = self.refresh()
+                if changed:
+                    print(f'{datetime.now():%H:%M:%S} rounds scored again: {", ".join(map(str, changed))}')
+            except Exception as e:
+                print(f'Warning: refresh failed, serving the previous results: {e!r}')
+
+
+class LeaderboardServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], results: WarmResults):
+        super().__init__(address, LeaderboardHandler)
+        self.results = results
+
+    @property
+    def base(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class LeaderboardHandler(BaseHTTPRequestHandler):
+    server: LeaderboardServer
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self, with_body=True):
+        found = self.server.results.get(unquote(urlsplit(self.path).path).rstrip('/'))
+        if found is None:
+            self.respond(404, b'{"error":"not found"}', with_body=with_body)
+        elif self.headers.get('If-None-Match') == found.etag:
+            self.respond(304, b'', found.etag, with_body)
+        else:
+            self.respond(200, found.body, found.etag, with_body)
+
+    def do_HEAD(self):
+        """The status and headers of a GET, without its body."""
+        self.do_GET(with_body=False)
+
+    def respond(self, status: int, body: bytes, etag: str = None, with_body: bool = True):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the leaderboards as JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--interval', type=float, default=SERVICE_REFRESH_INTERVAL,
+                        help='Seconds between two checks for changed rounds or configs')
+    parser.add_argument('--workers', type=int, default=SCORING_WORKERS, help='Worker processes for the first scoring')
+    args = parser.parse_args()
+
+    results = WarmResults(workers=args.workers)
+    results.warm()
+    stop = threading.Event()
+    threading.Thread(target=results.keep_fresh, args=(args.interval, stop), daemon=True).start()
+    server = LeaderboardServer((args.host, args.port), results)
+    print(f'Serving the leaderboards of {len(results.round_numbers)} rounds at {server.base}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
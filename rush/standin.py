@@ -0,0 +1,180 @@
+"""
+Local stand-in for the Valhalla pages of opendominion.net.
+
+Serves rounds at the same /valhalla/round/<id>/... paths as the site, either synthetic ones (see
+rush.synthetic) or the responses recorded by the transport in record mode. Responses can be delayed and
+a share of them can fail, so concurrency, retries and throughput can be measured without the site.
+
+    python -m rush.standin --port 8000 --latency 0.05 --error-rate 0.1
+    OD_BASE=http://127.0.0.1:8000 python main.py
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+from config import HTTP_ARCHIVE_DIR
+from rush.synthetic import synthetic_round, stat_page
+from rush.transport import HttpArchive
+
+ROUND_PATH = re.compile(r'/valhalla/round/(\d+)(?:/([a-z0-9-]+))?/?')
+# Headers of recorded responses that the stand-in sets itself, or that don't apply to the body as it is served
+SERVED_HEADERS = {'server', 'date', 'content-encoding', 'content-length', 'transfer-encoding', 'connection',
+                  'keep-alive'}
+
+
+def stat_slug(stat_name: str) -> str:
+    """The last part of the URL of a stat page, e.g. 'largest-dominions' for The Largest Dominions."""
+    return re.sub('[^a-z0-9]+', '-', re.sub('^the ', '', stat_name.lower())).strip('-')
+
+
+class SyntheticValhalla:
+    """Synthetic rounds, generated on first request with the round id as seed."""
+
+    def __init__(self, players: int, stats: int):
+        self.players = players
+        self.stats = stats
+        self._rounds = dict()
+        self._lock = threading.Lock()
+
+    def pages(self, round_id: int) -> dict:
+        with self._lock:
+            if round_id not in self._rounds:
+                self._rounds[round_id] = {stat_slug(name): (name, rankings) for name, rankings in
+                                          synthetic_round(self.players, self.stats, seed=round_id).items()}
+            return self._rounds[round_id]
+
+    def get(self, base: str, round_id: int, slug: str | None) -> tuple[int, dict, bytes]:
+        pages = self.pages(round_id)
+        if slug is None:
+            links = ''.join(f'<li><a href="{base}/valhalla/round/{round_id}/{slug}">{name}</a></li>'
+                            for slug, (name, rankings) in pages.items())
+            return 200, {}, f'<html><body><ul>{links}</ul></body></html>'.encode('utf-8')
+        if slug not in pages:
+            return 404, {}, b'Not found'
+        name, rankings = pages[slug]
+        return 200, {}, stat_page(name, rankings)
+
+
+class RecordedValhalla:
+    """Responses recorded by the transport, with links to the site rewritten to the stand-in."""
+
+    def __init__(self, archive: HttpArchive):
+        self.archive = archive
+        self.urls = {urlsplit(meta['url']).path.rstrip('/'): meta['url'] for meta in archive.recorded()}
+
+    def get(self, base: str, round_id: int, slug: str | None) -> tuple[int, dict, bytes]:
+        path = f'/valhalla/round/{round_id}' + (f'/{slug}' if slug else '')
+        if path not in self.urls:
+            return 404, {}, b'Not recorded'
+        url = self.urls[path]
+        response = self.archive.load(url)
+        site = '{0.scheme}://{0.netloc}'.format(urlsplit(url))
+        headers = {key: value for key, value in response.headers.items() if key.lower() not in SERVED_HEADERS}
+        return response.status_code, headers, response.content.replace(site.encode(), base.encode())
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], source, latency: float = 0, jitter: float = 0,
+                 error_rate: float = 0, error_codes: tuple[int, ...] = (503,), seed: int = None):
+        super().__init__(address, StandInHandler)
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+
+    @property
+    def base(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def inject_error(self) -> int | None:
+        """An error status to answer with instead of the page, or None."""
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return self.random.choice(self.error_codes)
+        return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.server.delay())
+        error = self.server.inject_error()
+        match = ROUND_PATH.fullmatch(urlsplit(self.path).path)
+        if error:
+            self.respond(error, {'Retry-After': '0'} if error == 429 else {}, b'Injected error')
+        elif not match:
+            self.respond(404, {}, b'Not found')
+        else:
+            status, headers, body = self.server.source.get(self.server.base, int(match.group(1)), match.group(2))
+            etag = headers.get('ETag') or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            if status == 200 and self.headers.get('If-None-Match') == etag:
+                with self.server.lock:
+                    self.server.not_modified += 1
+                self.respond(304, {'ETag': etag}, b'')
+            else:
+                self.respond(status, {'Content-Type': 'text/html; charset=UTF-8', **headers, 'ETag': etag}, body)
+
+    def respond(self, status: int, headers: dict, body: bytes):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Valhalla rounds locally.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--recorded', action='store_true', help='Serve the recorded responses instead of synthetic rounds')
+    parser.add_argument('--archive', default=HTTP_ARCHIVE_DIR, help='Directory of the recorded responses')
+    parser.add_argument('--players', type=int, default=1000, help='Players per synthetic round')
+    parser.add_argument('--stats', type=int, default=64, help='Stats per synthetic round')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds before every response')
+    parser.add_argument('--jitter', type=float, default=0, help='Random variation of the latency, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='Share of the requests that fail')
+    parser.add_argument('--error-codes', type=int, nargs='+', default=[503], help='Statuses of the failed requests')
+    parser.add_argument('--seed', type=int, help='Seed of the latency and error injection')
+    args = parser.parse_args()
+
+    source = RecordedValhalla(HttpArchive(args.archive)) if args.recorded else SyntheticValhalla(args.players, args.stats)
+    server = StandInServer((args.host, args.port), source, args.latency, args.jitter, args.error_rate,
+                           tuple(args.error_codes), args.seed)
+    print(f'Serving Valhalla at {server.base}, set OD_BASE={server.base} to use it')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'{server.requests} requests, {server.errors} injected errors, {server.not_modified} not modified')
+
+
+if __name__ == '__main__':
+    main()
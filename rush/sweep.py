@@ -0,0 +1,263 @@
+"""
+What-if sweeps of scoring config variants.
+
+A sweep takes a base config and a list of variants, each a set of overrides of the base, and scores all
+of them on the same rounds. Every variant is compared to the base: how well it keeps the order of the
+players (Spearman rank correlation) and how much of the top N changes (churn), per round and over the
+rounds together.
+
+Overrides are written as "Category.key": value, or "*.key": value to set a key of every category:
+
+    {
+        "grid": {"War.weight": [15, 20, 25], "*.scaling_style": ["log", "power"]},
+        "variants": [{"Land.weight": 5}, {"*.small_land_penalty_threshold": 4000}]
+    }
+
+A grid gives a variant for every combination of its values. Each round is loaded once. Category scores
+only depend on the rankings, calculation and scaling of a category, and the small-land penalty only on
+the land sizes and penalty settings, so those are computed once per round and shared by all variants.
+Totals match blop_scores_for_round, rounded to 3 decimals with round() like ScoringPlan.score.
+
+    python -m rush.sweep variants.json [--base v6] [--last 10] [--top 10]
+"""
+import argparse
+import copy
+import itertools
+import json
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from config import OUT_DIR, ALL_ROUNDS, LEADERBOARD_SIZE, load_scoring_config, validate_scoring_config, \
+    scoring_configs
+from rush.players import player_registry
+from rush.repository import repository
+from rush.rushrankings import is_dom_stat, all_player_names
+from rush.scaling import scale_column
+from rush.scoringplan import ScoringPlan, CategoryPlan, land_arrays
+
+
+@dataclass
+class Variant:
+    name: str
+    overrides: dict
+    config: dict
+
+
+def apply_overrides(base_config: dict, overrides: dict) -> dict:
+    """A copy of the config with the overrides applied."""
+    config = copy.deepcopy(base_config)
+    for path, value in overrides.items():
+        category_name, _, key = path.partition('.')
+        if not key:
+            raise ValueError(f'Override {path!r} is not of the form "Category.key"')
+        if category_name == '*':
+            categories = config.values()
+        elif category_name in config:
+            categories = [config[category_name]]
+        else:
+            raise ValueError(f'Unknown category {category_name!r} in override {path!r}')
+        for category in categories:
+            category[key] = value
+    return config
+
+
+def variant_name(overrides: dict) -> str:
+    return ', '.join(f'{path}={value}' for path, value in overrides.items()) or 'base'
+
+
+def grid_variants(base_config: dict, grid: dict[str, list]) -> list[Variant]:
+    """A variant for every combination of the values in the grid."""
+    paths = list(grid)
+    variants = list()
+    for values in itertools.product(*(grid[path] for path in paths)):
+        overrides = dict(zip(paths, values))
+        variants.append(Variant(variant_name(overrides), overrides, apply_overrides(base_config, overrides)))
+    return variants
+
+
+def load_variants(file_name: str, base_config: dict) -> list[Variant]:
+    with open(file_name) as f:
+        spec = json.load(f)
+    variants = grid_variants(base_config, spec['grid']) if 'grid' in spec else list()
+    for overrides in spec.get('variants', []):
+        variants.append(Variant(variant_name(overrides), overrides, apply_overrides(base_config, overrides)))
+    for variant in variants:
+        validate_scoring_config(variant.config, f'{file_name}: variant {variant.name}')
+    return variants
+
+
+def average_ranks(scores: np.ndarray) -> np.ndarray:
+    """Rank of every score, highest first, with tied scores sharing their average rank."""
+    order = np.argsort(-scores, kind='stable')
+    sorted_scores = scores[order]
+    starts = np.flatnonzero(np.r_[True, sorted_scores[1:] != sorted_scores[:-1]])
+    ends = np.r_[starts[1:], len(scores)]
+    ranks = np.empty(len(scores))
+    ranks[order] = np.repeat((starts + ends + 1) / 2, ends - starts)
+    return ranks
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    if len(a) < 2:
+        return 1.0
+    ranks_a, ranks_b = average_ranks(a), average_ranks(b)
+    if ranks_a.std() == 0 or ranks_b.std() == 0:
+        return 1.0 if np.array_equal(ranks_a, ranks_b) else 0.0
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+def top_n_churn(base: np.ndarray, variant: np.ndarray, n: int) -> float:
+    """Share of the players in the top N of the base that are not in the top N of the variant."""
+    n = min(n, len(base))
+    if n == 0:
+        return 0.0
+    base_top = np.argsort(-base, kind='stable')[:n]
+    variant_top = np.argsort(-variant, kind='stable')[:n]
+    return 1 - len(np.intersect1d(base_top, variant_top)) / n
+
+
+class RoundSweep:
+    """One round, prepared for scoring any number of variants."""
+
+    def __init__(self, round_number: int, base_plan: ScoringPlan):
+        self.round_number = round_number
+        self.stats = repository.stats(round_number, stat_filter=is_dom_stat, scaling_methods=base_plan.scaling_methods)
+        self.base_methods = base_plan.scaling_methods
+        self.players = all_player_names(self.stats)
+        self.player_indices = np.array([self.stats.player_index[name] for name in self.players], dtype=np.intp)
+        land_sizes = repository.land_sizes(round_number, stat_filter=is_dom_stat)
+        self.land_sizes = {player: land_sizes[player] for player in self.players if player in land_sizes}
+        self.land = land_arrays(self.players, self.land_sizes)
+        self._fs_rows = dict()
+        self._categories = dict()
+        self._penalties = dict()
+
+    def fs_row(self, stat_name: str, style: str) -> np.ndarray:
+        """Scaled scores of the players in a stat. Stats missing from the round score 0."""
+        key = (stat_name, style)
+        if key not in self._fs_rows:
+            stat = self.stats.stat_index.get(stat_name)
+            if stat is None:
+                row = np.zeros(len(self.players))
+            elif self.base_methods.get(stat_name) == style:
+                row = self.stats.fs_score[stat, self.player_indices]
+            else:
+                ranked = self.stats.order[stat]
+                full = np.zeros(len(self.stats.player_names))
+                full[ranked] = scale_column(self.stats.score[stat, ranked], style)
+                row = full[self.player_indices]
+            self._fs_rows[key] = row
+        return self._fs_rows[key]
+
+    def category_score(self, category: CategoryPlan, methods: dict[str, str]) -> np.ndarray:
+        """Unweighted, unpenalized category score."""
+        styles = tuple(methods[stat_name] for stat_name in category.rankings)
+        key = (tuple(category.rankings), category.best, styles)
+        if key not in self._categories:
+            unweighted = CategoryPlan(category.name, category.rankings, 1, category.best)
+            fs_scores = np.array([self.fs_row(stat_name, style) for stat_name, style in zip(category.rankings, styles)])
+            self._categories[key] = unweighted.combine(fs_scores.reshape(len(styles), len(self.players)))
+        return self._categories[key]
+
+    def penalty(self, category: CategoryPlan) -> np.ndarray | None:
+        """Small-land penalty multiplier of every player, or None if the category has none."""
+        if not self.land_sizes or category.max_penalty <= 0:
+            return None
+        key = (category.max_penalty, category.penalty_threshold)
+        if key not in self._penalties:
+            self._penalties[key] = category.apply_penalty(np.ones(len(self.players)), *self.land)
+        return self._penalties[key]
+
+    def totals(self, plan: ScoringPlan) -> np.ndarray:
+        methods = plan.scaling_methods
+        total = 0
+        for category in plan.categories:
+            scores = self.category_score(category, methods) * category.weight
+            multiplier = self.penalty(category)
+            if multiplier is not None:
+                scores = scores * multiplier
+            total = total + scores
+        # Rounded like ScoringPlan.score, so ties and ranks are those of the reports
+        totals = np.broadcast_to(np.asarray(total, dtype=np.float64), (len(self.players),)).tolist()
+        return np.array([round(score, 3) for score in totals], dtype=np.float64)
+
+
+@dataclass
+class VariantResult:
+    variant: Variant
+    round_spearman: dict[int, float] = field(default_factory=dict)
+    round_churn: dict[int, float] = field(default_factory=dict)
+    spearman: float = 1.0       # Over the totals of all rounds together
+    churn: float = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(name=self.variant.name, overrides=self.variant.overrides, spearman=self.spearman,
+                    churn=self.churn, mean_round_spearman=float(np.mean(list(self.round_spearman.values()))),
+                    min_round_spearman=min(self.round_spearman.values()),
+                    mean_round_churn=float(np.mean(list(self.round_churn.values()))),
+                    rounds={nr: dict(spearman=self.round_spearman[nr], churn=self.round_churn[nr])
+                            for nr in self.round_spearman})
+
+
+def sweep(base_config: dict, variants: list[Variant], round_numbers: list[int], top_n: int = LEADERBOARD_SIZE) -> list[VariantResult]:
+    """Score every variant on every round and compare it with the base config."""
+    base_plan = ScoringPlan.compile(base_config)
+    plans = [ScoringPlan.compile(variant.config) for variant in variants]
+    results = [VariantResult(variant) for variant in variants]
+
+    # All players of all rounds, for the totals over the rounds
+    rounds = [RoundSweep(nr, base_plan) for nr in round_numbers]
+    rows = [player_registry.intern_all(round_sweep.players) for round_sweep in rounds]
+    everyone, rows = np.unique(np.concatenate(rows), return_inverse=True)
+    rows = np.split(rows, np.cumsum([len(round_sweep.players) for round_sweep in rounds])[:-1])
+
+    base_lifetime = np.zeros(len(everyone))
+    lifetime = np.zeros((len(variants), len(everyone)))
+    for round_sweep, round_rows in zip(rounds, rows):
+        base_totals = round_sweep.totals(base_plan)
+        base_lifetime[round_rows] += base_totals
+        for i, (plan, result) in enumerate(zip(plans, results)):
+            totals = round_sweep.totals(plan)
+            lifetime[i, round_rows] += totals
+            result.round_spearman[round_sweep.round_number] = spearman(base_totals, totals)
+            result.round_churn[round_sweep.round_number] = top_n_churn(base_totals, totals, top_n)
+
+    for i, result in enumerate(results):
+        result.spearman = spearman(base_lifetime, lifetime[i])
+        result.churn = top_n_churn(base_lifetime, lifetime[i], top_n)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score variants of a scoring config and compare them with the base.')
+    parser.add_argument('variants', help='JSON file with a "grid" and/or a list of "variants"')
+    parser.add_argument('--base', default='v6', help='Base scoring config: a version, or a config file')
+    parser.add_argument('--rounds', type=int, nargs='+', help='Rounds to score, by default the last ones')
+    parser.add_argument('--last', type=int, default=10, help='Number of last rounds to score')
+    parser.add_argument('--top', type=int, default=LEADERBOARD_SIZE, help='N of the top N churn')
+    parser.add_argument('--out', default=f'{OUT_DIR}/Sweep.json', help='Results file')
+    args = parser.parse_args()
+
+    if args.base in scoring_configs:
+        base_config = scoring_configs[args.base]
+    else:
+        base_config = load_scoring_config(args.base)
+        validate_scoring_config(base_config, args.base)
+    variants = load_variants(args.variants, base_config)
+    round_numbers = args.rounds or ALL_ROUNDS[:args.last]
+    print(f'Sweeping {len(variants)} variants over rounds {", ".join(map(str, round_numbers))}')
+    results = sweep(base_config, variants, round_numbers, args.top)
+
+    print(f"{'spearman':>9} {'churn':>6} {'worst round':>11}  variant")
+    for result in results:
+        summary = result.as_dict()
+        print(f"{summary['spearman']:>9.4f} {summary['churn']:>6.2f} {summary['min_round_spearman']:>11.4f}  {result.variant.name}")
+    with open(args.out, 'w') as f:
+        json.dump(dict(base=args.base, rounds=round_numbers, top=args.top,
+                       variants=[result.as_dict() for result in results]), f, indent=2)
+    print('Results written to', args.out)
+
+
+if __name__ == '__main__':
+    main()
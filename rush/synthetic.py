@@ -0,0 +1,124 @@
+"""
+Synthetic Valhalla data, shaped like the real thing, for benchmarks.
+
+The rounds use the stat names of the scoring configs, padded with the other stats Valhalla shows. Every
+player shows up in The Largest Dominions with a land size; the black ops stats only list the fraction
+of players that actually blop. Scores are heavy tailed like the real ones. Everything is generated from
+a seed, so the same call gives the same round.
+"""
+import html
+
+import numpy as np
+
+from config import scoring_configs
+from rush.roundfile import StatColumns
+from rush.roundstats import RoundStats
+
+# Valhalla stats that no scoring config uses
+OTHER_STATS = [
+    'The Strongest Dominions', 'Most Prestigious Dominions', 'Most Land Conquered', 'Most Land Explored',
+    'Most Land Lost', 'Most Successful Attackers', 'Most Invasions', 'Most Land Defended', 'Largest Armies',
+    'Most Networth', 'Most Spy Networth', 'Most Wizard Networth', 'Top Platinum Producers', 'Top Food Producers',
+    'Top Lumber Producers', 'Top Mana Producers', 'Top Ore Producers', 'Top Gem Producers', 'Top Boat Producers',
+    'Top Researchers', 'Most Buildings Constructed', 'Most Spells Cast', 'Most Spy Ops Performed',
+    'Most Heroes Levelled', 'Most Wonders Destroyed', 'Most Wonders Conquered', 'Longest Streaks',
+    'Most Units Killed', 'Most Units Lost', 'The Largest Solo Dominions', 'The Largest Pack Dominions',
+    'The Largest Realms', 'The Strongest Realms', 'The Largest Packs',
+]
+
+LAND_STAT = 'The Largest Dominions'
+BLOP_SHARE = 0.3        # Share of the players listed in a black ops stat
+OTHER_SHARE = 0.8       # Share of the players listed in any other dominion stat
+PLAYERS_PER_REALM = 12
+
+
+def config_stat_names() -> list[str]:
+    """All stats used by the scoring configs, in config order."""
+    names = dict()
+    for config in scoring_configs.values():
+        for category in config.values():
+            names.update(dict.fromkeys(category['rankings']))
+    return list(names)
+
+
+def stat_names(count: int = 64) -> list[str]:
+    """The config stats, then the other Valhalla stats, then numbered ones until there are `count`."""
+    names = list(dict.fromkeys([LAND_STAT] + config_stat_names() + OTHER_STATS))
+    names += [f'Top Synthetic Stat {i}' for i in range(1, count - len(names) + 1)]
+    return names[:count]
+
+
+def player_names(count: int) -> list[str]:
+    """Player names, with some of the commas, ampersands and accents that real names have."""
+    names = list()
+    for i in range(count):
+        if i % 97 == 13:
+            names.append(f'Player {i}, the Bold')
+        elif i % 89 == 7:
+            names.append(f'Tom & Jerry {i}')
+        elif i % 83 == 5:
+            names.append(f'Ñandú {i}')
+        else:
+            names.append(f'Player {i}')
+    return names
+
+
+def synthetic_stat(stat_name: str, players: list[str], land: np.ndarray, rng: np.random.Generator,
+                   blop: bool = False) -> StatColumns:
+    """The rankings of one stat page, best first. `land` holds the land size of every player."""
+    if 'Realm' in stat_name or ('Pack' in stat_name and 'Dominions' not in stat_name):
+        listed = [f'Realm {i}' for i in range(1, len(players) // PLAYERS_PER_REALM + 2)]
+        scores = rng.gamma(2.0, 1500.0 * PLAYERS_PER_REALM, size=len(listed))
+    else:
+        if stat_name == LAND_STAT:
+            picked = np.arange(len(players))
+        else:
+            share = BLOP_SHARE if blop else OTHER_SHARE
+            picked = rng.choice(len(players), size=max(1, int(len(players) * share)), replace=False)
+        listed = [players[i] for i in picked.tolist()]
+        if 'Largest' in stat_name:
+            scores = land[picked]
+        else:
+            scores = rng.lognormal(8.0, 2.0, size=len(listed))
+    scores = np.maximum(scores.astype(np.int64), 1)
+    order = np.argsort(-scores, kind='stable')
+    return StatColumns([listed[i] for i in order.tolist()], np.arange(1, len(listed) + 1, dtype=np.int32),
+                       scores[order])
+
+
+def synthetic_round(players: int = 1000, stats: int = 64, seed: int = 0) -> dict[str, StatColumns]:
+    """A round as {stat name: StatColumns}."""
+    rng = np.random.default_rng(seed)
+    names = player_names(players)
+    land = 250 + rng.gamma(2.0, 1500.0, size=players)
+    blop_stats = set(config_stat_names())
+    return {stat_name: synthetic_stat(stat_name, names, land, rng, stat_name in blop_stats)
+            for stat_name in stat_names(stats)}
+
+
+def synthetic_round_stats(players: int = 1000, stats: int = 64, seed: int = 0) -> RoundStats:
+    """A round as unscaled RoundStats, as load_stats would build it."""
+    return RoundStats.from_rankings(synthetic_round(players, stats, seed))
+
+
+def round_configs(rounds: int) -> dict[int, dict]:
+    """{round number: scoring config} for a series of rounds, newest first, each config used for a stretch."""
+    configs = list(scoring_configs.values())
+    return {1000 + rounds - i: configs[len(configs) - 1 - i * len(configs) // rounds] for i in range(rounds)}
+
+
+PAGE = """<!DOCTYPE html><html><head><title>Valhalla</title></head><body>
+<div class="box"><div class="box-header"><h3 class="box-title">{title}</h3></div>
+<div class="box-body table-responsive no-padding"><table class="table"><thead><tr>
+<th>#</th><th>Dominion</th><th>Player</th><th>Race</th><th>Realm</th><th>Value</th></tr></thead>
+<tbody>{rows}</tbody></table></div></div></body></html>"""
+
+ROW = """<tr><td class="text-center">{rank}</td><td><a href="/valhalla/dominion/{rank}">Dominion {rank}</a></td>
+<td>{player}</td><td>Human</td><td class="text-center">{realm}</td><td class="text-center">{score:,}</td></tr>"""
+
+
+def stat_page(title: str, rankings: StatColumns) -> bytes:
+    """The HTML of a Valhalla stat page listing `rankings`."""
+    rows = [ROW.format(rank=rank, player=html.escape(player), realm=rank % 25 + 1, score=score)
+            for player, rank, score in zip(rankings.players, rankings.rank.tolist(), rankings.score.tolist())]
+    return PAGE.format(title=html.escape(title), rows=''.join(rows)).encode('utf-8')
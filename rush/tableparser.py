@@ -0,0 +1,150 @@
+"""
+Streaming extractor for the ranking table of a Valhalla page.
+
+Instead of building a document tree, a regex tokenizer emits start tag, end tag and text events
+and a listener only keeps what the scrapers read: the text of the first paragraph in the `box-body`
+div (the "No records found." marker) and the cell texts of the rows in the first `tbody`. Markup it
+doesn't expect raises UnexpectedMarkup, so callers can fall back to BeautifulSoup.
+"""
+import re
+from dataclasses import dataclass
+from html import unescape
+
+# Comments, raw text elements and declarations are skipped; tags are (slash, name, attributes).
+TOKEN_PATTERN = re.compile(r"""
+    <!--.*?-->
+  | <(?P<raw>script|style)\b.*?</(?P=raw)\s*>
+  | <[!?][^>]*>
+  | <(?P<slash>/?)(?P<name>[A-Za-z][A-Za-z0-9]*)(?P<attrs>(?:[^>"']|"[^"]*"|'[^']*')*)>
+""", re.DOTALL | re.IGNORECASE | re.VERBOSE)
+CLASS_PATTERN = re.compile(r"""(?:^|\s)class\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+
+class UnexpectedMarkup(ValueError):
+    pass
+
+
+@dataclass
+class TableExtract:
+    box_body_found: bool = False
+    first_paragraph: str | None = None      # Stripped text of the first <p> inside the box-body div
+    rows: list[list[str]] | None = None      # Stripped cell texts per row of the first tbody, None without tbody
+
+    @property
+    def no_records(self) -> bool:
+        return self.first_paragraph == 'No records found.'
+
+
+class _Done(Exception):
+    """Raised to stop parsing once everything of interest has been seen."""
+
+
+class _TableListener:
+    def __init__(self):
+        self.result = TableExtract()
+        self.box_body_depth = 0     # Nesting depth of divs inside the box-body div, 0 when outside
+        self.in_paragraph = False
+        self.paragraph = list()
+        self.tbody_state = 'before'     # before -> inside -> after
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag: str, attrs: str):
+        if tag == 'div':
+            if self.box_body_depth:
+                self.box_body_depth += 1
+            elif not self.result.box_body_found and 'box-body' in _classes(attrs):
+                self.result.box_body_found = True
+                self.box_body_depth = 1
+        elif tag == 'p' and self.box_body_depth and self.result.first_paragraph is None:
+            self.in_paragraph = True
+        elif tag == 'tbody' and self.tbody_state == 'before':
+            self.tbody_state = 'inside'
+            self.result.rows = list()
+        elif self.tbody_state == 'inside':
+            if tag == 'tr':
+                if self.row is not None:
+                    raise UnexpectedMarkup('Nested or unclosed <tr>')
+                self.row = list()
+            elif tag == 'td':
+                if self.row is None or self.cell is not None:
+                    raise UnexpectedMarkup('<td> outside a row or unclosed <td>')
+                self.cell = list()
+            elif tag in ('table', 'tbody', 'template'):
+                raise UnexpectedMarkup(f'<{tag}> inside the table body')
+
+    def handle_endtag(self, tag: str):
+        if tag == 'div' and self.box_body_depth:
+            self.box_body_depth -= 1
+            if self.in_paragraph:
+                self._close_paragraph()
+            self._check_done()
+        elif tag == 'p' and self.in_paragraph:
+            self._close_paragraph()
+        elif self.tbody_state == 'inside':
+            if tag == 'td' and self.cell is not None:
+                self.row.append(unescape(''.join(self.cell)).strip())
+                self.cell = None
+            elif tag == 'tr' and self.row is not None:
+                if self.cell is not None:
+                    raise UnexpectedMarkup('Unclosed <td>')
+                self.result.rows.append(self.row)
+                self.row = None
+            elif tag == 'tbody':
+                if self.row is not None:
+                    raise UnexpectedMarkup('Unclosed <tr>')
+                self.tbody_state = 'after'
+                self._check_done()
+
+    def handle_data(self, data: str):
+        if self.cell is not None:
+            self.cell.append(data)
+        if self.in_paragraph:
+            self.paragraph.append(data)
+
+    def _close_paragraph(self):
+        self.in_paragraph = False
+        self.result.first_paragraph = unescape(''.join(self.paragraph)).strip()
+
+    def _check_done(self):
+        # The marker paragraph may follow the table inside the box-body, so only stop when both are settled
+        marker_settled = self.result.first_paragraph is not None or (self.result.box_body_found and not self.box_body_depth)
+        if self.tbody_state == 'after' and marker_settled:
+            raise _Done()
+
+
+def _classes(attrs: str) -> list[str]:
+    match = CLASS_PATTERN.search(attrs)
+    if not match:
+        return []
+    return unescape(next(group for group in match.groups() if group is not None)).split()
+
+
+def extract_table(page: str | bytes) -> TableExtract:
+    """Read the box-body marker and the table rows of a page. Bytes must be UTF-8."""
+    if isinstance(page, bytes):
+        try:
+            page = page.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise UnexpectedMarkup(f'Page is not UTF-8: {e}')
+    listener = _TableListener()
+    try:
+        position = 0
+        for token in TOKEN_PATTERN.finditer(page):
+            if token.start() > position:
+                listener.handle_data(page[position:token.start()])
+            position = token.end()
+            if token['raw']:
+                if listener.tbody_state == 'inside':
+                    raise UnexpectedMarkup(f"<{token['raw']}> inside the table body")
+            elif token['name']:
+                if token['slash']:
+                    listener.handle_endtag(token['name'].lower())
+                else:
+                    listener.handle_starttag(token['name'].lower(), token['attrs'])
+        listener.handle_data(page[position:])
+    except _Done:
+        pass
+    if listener.tbody_state == 'inside':
+        raise UnexpectedMarkup('Unclosed <tbody>')
+    return listener.result
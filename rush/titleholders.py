@@ -0,0 +1,77 @@
+"""
+Title holders: the players with the highest score in a stat, ties included.
+
+Works on the raw scores of the RoundStats of the rounds, so any number of rounds is written in one
+run, each round from the round cache once its pages have been downloaded. The rounds are the same
+unfiltered loads the Dave rankings use, so both reports share them.
+
+Run from the project root:  python -m rush.titleholders [round numbers] [--last n | --all]
+"""
+import argparse
+import os
+from typing import Callable
+
+from config import OUT_DIR, ALL_ROUNDS, LAST_ROUND
+from rush.repository import repository
+from rush.roundstats import RoundStats
+
+EXCLUDE_STATS = ['Realm', 'Pack']
+
+
+def to_include(stat_name: str) -> bool:
+    for exclude_name in EXCLUDE_STATS:
+        if exclude_name in stat_name:
+            return False
+    return True
+
+
+def title_holders(stats: RoundStats, stat_filter: Callable[[str], bool] = to_include) -> dict[str, list[tuple[str, int]]]:
+    """{stat name: [(player, score)]} of the holders of every included stat, in page order."""
+    holders = dict()
+    for stat, stat_name in enumerate(stats.stat_names):
+        if not stat_filter(stat_name):
+            continue
+        players = stats.order[stat]
+        if not len(players):
+            holders[stat_name] = []
+            continue
+        scores = stats.score[stat, players]
+        best = players[scores == scores.max()]
+        holders[stat_name] = [(stats.player_names[player], int(stats.score[stat, player])) for player in best.tolist()]
+    return holders
+
+
+def write_title_holders(holders: dict[str, list[tuple[str, int]]], round_number: int, out_dir: str = OUT_DIR) -> str:
+    file_name = f'{out_dir}/Title Holders Round {round_number}.txt'
+    with open(file_name, 'w') as f:
+        f.writelines(f"{stat},{player},{score}\n" for stat, stat_holders in holders.items()
+                     for player, score in stat_holders)
+    return file_name
+
+
+def round_title_holders(round_numbers: list[int], out_dir: str = OUT_DIR) -> list[str]:
+    """Write the title holders of every round. Returns the files written."""
+    os.makedirs(out_dir, exist_ok=True)
+    return [write_title_holders(title_holders(repository.stats(round_number)), round_number, out_dir)
+            for round_number in round_numbers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the title holders of rounds.')
+    parser.add_argument('rounds', type=int, nargs='*', help='Round numbers, by default the last round')
+    parser.add_argument('--last', type=int, help='The last N rounds')
+    parser.add_argument('--all', action='store_true', help='All rounds')
+    args = parser.parse_args()
+
+    if args.all:
+        round_numbers = ALL_ROUNDS
+    elif args.last:
+        round_numbers = ALL_ROUNDS[:args.last]
+    else:
+        round_numbers = args.rounds or [LAST_ROUND]
+    for file_name in round_title_holders(round_numbers):
+        print('Written', file_name)
+
+
+if __name__ == '__main__':
+    main()
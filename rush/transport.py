@@ -0,0 +1,109 @@
+"""
+HTTP transport under the fetcher, so the scraper can run without opendominion.net.
+
+    live    requests go to the site
+    record  requests go to the site, and every response is archived to disk as well
+    replay  responses come from the archive, nothing goes over the network
+
+The archive holds the latest response per URL: its status, headers and raw body.
+
+    cache/http/<hash of the URL>.json
+    cache/http/<hash of the URL>.body
+
+Replay answers conditional requests with 304 Not Modified when the validators match the archived
+response, like the site does. URLs that were never recorded get a 404.
+"""
+import hashlib
+import json
+import os
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config import TRANSPORT_MODE, HTTP_ARCHIVE_DIR
+
+MODES = ('live', 'record', 'replay')
+
+
+class HttpArchive:
+    def __init__(self, archive_dir: str = HTTP_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+
+    def file_name(self, url: str) -> str:
+        return f'{self.archive_dir}/{hashlib.sha256(url.encode()).hexdigest()[:32]}'
+
+    def save(self, url: str, response: requests.Response):
+        file_name = self.file_name(url)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with open(file_name + '.body.tmp', 'wb') as f:
+            f.write(response.content)
+        os.replace(file_name + '.body.tmp', file_name + '.body')
+        with open(file_name + '.json.tmp', 'w') as f:
+            json.dump(dict(url=url, status=response.status_code, headers=dict(response.headers)), f)
+        os.replace(file_name + '.json.tmp', file_name + '.json')
+
+    def load(self, url: str) -> requests.Response | None:
+        file_name = self.file_name(url)
+        if not os.path.exists(file_name + '.json'):
+            return None
+        with open(file_name + '.json') as f:
+            meta = json.load(f)
+        with open(file_name + '.body', 'rb') as f:
+            return make_response(meta['url'], meta['status'], meta['headers'], f.read())
+
+    def recorded(self) -> list[dict]:
+        """URL, status and headers of every archived response."""
+        result = list()
+        for file_name in sorted(os.listdir(self.archive_dir)) if os.path.isdir(self.archive_dir) else []:
+            if file_name.endswith('.json'):
+                with open(f'{self.archive_dir}/{file_name}') as f:
+                    result.append(json.load(f))
+        return result
+
+
+def make_response(url: str, status: int, headers: dict, content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def not_modified(request_headers: dict | None, response: requests.Response) -> bool:
+    """Whether a conditional request is satisfied by the response it would get."""
+    request_headers = request_headers or dict()
+    etag = response.headers.get('ETag')
+    if 'If-None-Match' in request_headers:
+        return etag is not None and request_headers['If-None-Match'] == etag
+    last_modified = response.headers.get('Last-Modified')
+    return last_modified is not None and request_headers.get('If-Modified-Since') == last_modified
+
+
+class Transport:
+    """Sends GETs for the fetcher in one of the MODES."""
+
+    def __init__(self, session: requests.Session, mode: str = TRANSPORT_MODE, archive: HttpArchive = None):
+        if mode not in MODES:
+            raise ValueError(f'Unknown transport mode {mode!r}, expected one of {", ".join(MODES)}')
+        self.session = session
+        self.mode = mode
+        self.archive = archive or HttpArchive()
+
+    def get(self, url: str, headers: dict = None, timeout: float = None) -> requests.Response:
+        if self.mode == 'replay':
+            return self.replay(url, headers)
+        response = self.session.get(url, headers=headers, timeout=timeout)
+        if self.mode == 'record' and response.status_code != 304:
+            self.archive.save(url, response)
+        return response
+
+    def replay(self, url: str, headers: dict = None) -> requests.Response:
+        response = self.archive.load(url)
+        if response is None:
+            return make_response(url, 404, {}, b'Not recorded')
+        if response.status_code == 200 and not_modified(headers, response):
+            return make_response(url, 304, {key: response.headers[key] for key in ('ETag', 'Last-Modified')
+                                            if key in response.headers}, b'')
+        return response
@@ -0,0 +1,130 @@
+"""
+Watch mode for a live round.
+
+Polls the Valhalla pages of the round at a fixed interval with conditional GETs, so unchanged pages
+cost neither bandwidth nor parsing. Only the stats that changed are scaled again and only the
+players ranked in them are scored again, unless the land bounds of the small-land penalty moved.
+Every cycle rewrites the live standings and appends the leaderboard changes to a watch log.
+
+Run from the project root:  python -m rush.watch [round number] [--interval seconds] [--cycles n]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from config import OUT_DIR, ALL_BLOP_ROUNDS, LAST_ROUND, WATCH_INTERVAL
+from rush.fetcher import Fetcher, default_fetcher
+from rush.rankingscraper import get_cached_stat_pages, land_sizes_from_stats
+from rush.roundcache import RoundCache
+from rush.roundstats import RoundStats
+from rush.rushrankings import is_dom_stat, all_player_names, sanitize_name_for_csv
+from rush.scaling import scale_round
+from rush.scoringplan import ScoringPlan
+
+
+class RoundWatcher:
+    def __init__(self, round_number: int, config: dict, out_dir: str = OUT_DIR, fetcher: Fetcher = None):
+        self.round_number = round_number
+        self.plan = ScoringPlan.compile(config)
+        self.scaling_methods = self.plan.scaling_methods
+        self.out_dir = out_dir
+        self.fetcher = fetcher or default_fetcher()
+        self.cache = RoundCache(round_number)
+        self.stats: RoundStats | None = None
+        self.land_sizes = dict()
+        self.land_bounds = None
+        self.scores = dict()        # {player: total score}
+        self.ranks = dict()         # {player: rank} of the previous cycle
+
+    def poll(self) -> dict:
+        """Revalidate the pages of the round. Returns the rankings of the stats that changed since the last poll."""
+        pages = get_cached_stat_pages(self.round_number, is_dom_stat, self.fetcher, self.cache, live=True)
+        changed = pages.keys() if self.stats is None else self.cache.last_changed
+        # Keep the previous rankings of a stat page that came back empty
+        return {name: pages[name] for name in changed if pages.get(name)}
+
+    def rescore(self, changed: dict) -> list[str]:
+        """Apply changed stats, scale them and score the players they affect. Returns those players."""
+        affected = set(name for rankings in changed.values() for name in rankings)
+        if self.stats is None:
+            self.stats = RoundStats.from_rankings(changed)
+        else:
+            # Players that dropped out of a changed stat are affected as well
+            affected.update(name for stat_name in changed if stat_name in self.stats for name in self.stats[stat_name])
+            self.stats.update(changed)
+        scale_round(self.stats, self.scaling_methods, stat_names=list(changed))
+
+        players = all_player_names(self.stats)
+        if any('Largest' in stat_name for stat_name in changed) or not self.land_sizes:
+            known_players = set(players)
+            self.land_sizes = {player: land for player, land in land_sizes_from_stats(self.stats).items()
+                               if player in known_players}
+        land_bounds = (min(self.land_sizes.values()), max(self.land_sizes.values())) if self.land_sizes else None
+        if land_bounds != self.land_bounds:
+            # The small-land penalty of every player depends on the bounds
+            self.land_bounds = land_bounds
+            to_score = players
+        else:
+            to_score = [player for player in players if player in affected]
+
+        result = self.plan.score(self.stats, to_score, self.land_sizes)
+        # Players that dropped off every stat page are no longer in the round
+        self.scores = {player: self.scores[player] for player in players if player in self.scores}
+        self.scores.update(zip(result.players, result.totals))
+        return to_score
+
+    def leaderboard(self) -> list[tuple[str, float]]:
+        return sorted(self.scores.items(), key=lambda e: e[1], reverse=True)
+
+    def diff(self, leaderboard: list[tuple[str, float]]) -> list[str]:
+        """Rank moves and new entries compared to the previous cycle."""
+        lines = list()
+        for rank, (player, score) in enumerate(leaderboard, start=1):
+            previous = self.ranks.get(player)
+            if previous is None:
+                lines.append(f"NEW   #{rank} {player} ({score})")
+            elif previous != rank:
+                direction = 'UP  ' if rank < previous else 'DOWN'
+                lines.append(f"{direction}  #{rank} {player} ({score}), was #{previous}")
+        return lines
+
+    def cycle(self) -> list[str]:
+        changed = self.poll()
+        if not changed:
+            print(f'{datetime.now():%H:%M:%S} No changes ({self.cache.counters})')
+            return list()
+        rescored = self.rescore(changed)
+        leaderboard = self.leaderboard()
+        lines = self.diff(leaderboard)
+        self.ranks = {player: rank for rank, (player, score) in enumerate(leaderboard, start=1)}
+        self.write(leaderboard, lines)
+        print(f'{datetime.now():%H:%M:%S} {len(changed)} stats changed, {len(rescored)} players rescored, '
+              f'{len(lines)} leaderboard changes ({self.cache.counters})')
+        return lines
+
+    def write(self, leaderboard: list[tuple[str, float]], lines: list[str]):
+        with open(f'{self.out_dir}/Top (Black) Oppers Round {self.round_number} (Live).txt', 'w') as f:
+            for player, score in leaderboard:
+                f.write(f"{sanitize_name_for_csv(player)}, {self.land_sizes.get(player, 0)}, {score}\n")
+        if lines:
+            with open(f'{self.out_dir}/Watch Round {self.round_number}.txt', 'a') as f:
+                f.write(f"== {datetime.now():%Y-%m-%d %H:%M:%S} ==\n")
+                f.writelines(line + '\n' for line in lines)
+
+    def run(self, interval: float = WATCH_INTERVAL, cycles: int = None):
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            started = time.monotonic()
+            self.cycle()
+            cycle += 1
+            if cycles is None or cycle < cycles:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Watch a live round and publish its standings.')
+    parser.add_argument('round_number', type=int, nargs='?', default=LAST_ROUND)
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help='Seconds between polls')
+    parser.add_argument('--cycles', type=int, default=None, help='Stop after this many polls')
+    args = parser.parse_args()
+    RoundWatcher(args.round_number, ALL_BLOP_ROUNDS[args.round_number]).run(args.interval, args.cycles)
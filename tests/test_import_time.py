@@ -0,0 +1,22 @@
+"""The reports import within IMPORT_TIME_BUDGET, and without the network modules."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import IMPORT_TIME_BUDGET
+from main import import_time, REPORT_MODULES
+
+
+def test_reports_import_within_budget(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    import_time()
+    seconds = min(import_time()[0] for _ in range(3))
+    assert seconds <= IMPORT_TIME_BUDGET, f'Importing the reports takes {seconds * 1000:.0f} ms'
+
+
+def test_reports_import_without_network_modules(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    seconds, loaded = import_time(REPORT_MODULES + ('main',))
+    assert not loaded, f"{', '.join(loaded)} imported without fetching anything"
@@ -1,16 +1,28 @@
 """
 Generator for the OpenDominion Round Top 100 Wiki pages.
-"""
 
+The Largest Dominions page of every round is read through the round cache, so finished rounds are only
+downloaded once, and the pages of all requested rounds are fetched at the same time.
+
+    python tophundred.py [round ids] [--all] [--quiet]
+"""
+import argparse
 import re
-import requests
-from bs4 import BeautifulSoup
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict, field
 from datetime import datetime
-from config import OUT_DIR, LAST_ROUND, round_number_of_round_id
+from config import OUT_DIR, VALHALLA_URL, LAST_ROUND, ALL_ROUNDS, LIVE_ROUNDS, FETCH_CONCURRENCY, ROUND_NUMBERS
+from rush.fetcher import Fetcher, default_fetcher
+from rush.roundcache import RoundCache
+from rush.roundfile import TableRows
+from rush.tableparser import extract_table, UnexpectedMarkup
 
 
-URL = f"https://www.opendominion.net/valhalla/round/{LAST_ROUND}/largest-dominions"
+# Cached under the page URL with this suffix, next to the rankings of the same page
+TABLE_SUFFIX = '#table'
+# Runs of anything but a number or letter become a single underscore in a wiki link
+LINK_NAME_JUNK = re.compile('[^A-Za-z0-9]+')
 
 
 WIKI_TABLE = """{{| class="wikitable"
@@ -36,58 +48,95 @@ class Ranking:
     dominion_link_name: str = field(init=False)
 
     def __post_init__(self):
-        # If it's not a number or letter, turn into underscore
-        name = re.sub('[^A-Za-z0-9]', '_', self.dominion)
-        # remove multiple underscores in a row
-        name = re.sub('_{2,}', '_', name)
-        # remove underscores at the end
-        name = re.sub('_*$', '', name)
-        self.dominion_link_name = f"Round_{self.round}_{name}"
-
-
-def get_page(page_url: str) -> BeautifulSoup | None:
-    """Utility function to load a URL into a BeautifulSoup instance."""
-    page = requests.get(page_url)
-    if page.status_code == 200:
-        return BeautifulSoup(page.content, "html.parser")
-    else:
-        return None
-
-
-def parse_entries_from_page(soup: BeautifulSoup) -> dict[str, Ranking]:
-    """Pull rankings out of a stat page into a dict{player name: Ranking}."""
-    results = dict()
+        self.dominion_link_name = f"Round_{self.round}_{LINK_NAME_JUNK.sub('_', self.dominion).rstrip('_')}"
+
+
+def page_url(round_id: int) -> str:
+    return f"{VALHALLA_URL}/{round_id}/largest-dominions"
+
+
+def ranking_from_cells(entry: list[str], round_number: int) -> Ranking:
+    return Ranking(int(entry[0]),
+                   entry[1],
+                   entry[2],
+                   int(entry[-1].replace(',', '')),
+                   int(entry[4]),
+                   round_number)
+
+
+def table_rows(page: bytes) -> list[list[str]]:
+    """The cell texts of every row of the rankings table."""
+    try:
+        rows = extract_table(page).rows
+        if rows is None:
+            raise UnexpectedMarkup('No table body')
+        return rows
+    except UnexpectedMarkup as e:
+        print(f'Falling back to BeautifulSoup: {e}')
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(page, "html.parser")
+    if soup.tbody is None:
+        return []
+    return [[child.text.strip() for child in line.find_all('td')] for line in soup.tbody.find_all('tr')]
+
+
+def parse_table(name: str, response) -> TableRows:
+    return TableRows.from_rows(table_rows(response.content))
+
+
+def load_rankings(round_id: int, fetcher: Fetcher = None) -> list[Ranking]:
+    """The Largest Dominions of a round by rank, from the round cache. Empty if the page can't be loaded."""
+    cache = RoundCache(round_id)
     try:
-        for line in soup.tbody.find_all('tr'):
-            entry = [child.text.strip() for child in line.find_all('td')]
-            ranking = Ranking(int(entry[0]),
-                              entry[1],
-                              entry[2],
-                              int(entry[-1].replace(',', '')),
-                              int(entry[4]),
-                              round_number_of_round_id(LAST_ROUND))
-            results[ranking.player] = ranking
-    except AttributeError:
-        print(soup.contents)
-        raise
-    return results
+        tables = cache.get({'table': page_url(round_id) + TABLE_SUFFIX}, parse_table, fetcher or default_fetcher(),
+                           round_id in LIVE_ROUNDS)
+        if 'table' not in tables:
+            return []
+        round_number = ROUND_NUMBERS[round_id]
+        entries = [ranking_from_cells(list(row), round_number) for row in tables['table']]
+    finally:
+        cache.close()
+    return sorted(entries, key=lambda e: e.rank)
+
+
+def wiki_page(entries: list[Ranking]) -> str:
+    winner = entries[0]
+    lines = [(WIKI_LINE_WINNER if entry.realm == winner.realm else WIKI_LINE).format(**asdict(entry))
+             for entry in entries]
+    return WIKI_TABLE.format('\n'.join(lines))
+
+
+def write_top_hundreds(round_ids: list[int], out_dir: str = OUT_DIR) -> dict[int, str]:
+    """Write the wiki table of every round. Returns {round id: page} of the rounds that could be loaded."""
+    unknown = [round_id for round_id in round_ids if round_id not in ROUND_NUMBERS]
+    if unknown:
+        raise ValueError(f'Unknown round ids {", ".join(map(str, unknown))}')
+    fetcher = default_fetcher()
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as pool:
+        rankings = dict(zip(round_ids, pool.map(lambda round_id: load_rankings(round_id, fetcher), round_ids)))
+
+    pages = dict()
+    for round_id, entries in rankings.items():
+        if not entries:
+            print(f'Warning: no Largest Dominions for round {round_id}')
+            continue
+        pages[round_id] = wiki_page(entries)
+        with open(f"{out_dir}/top_100_round_{ROUND_NUMBERS[round_id]}.txt", 'w') as f:
+            f.write(pages[round_id])
+    return pages
 
 
 def main():
-    soup = get_page(URL)
-    entries = parse_entries_from_page(soup).values()
-    sorted_entries = sorted(entries, key=lambda e: e.rank)
-    winner = sorted_entries[0]
-    lines = list()
-    for entry in sorted_entries:
-        line = WIKI_LINE_WINNER if entry.realm == winner.realm else WIKI_LINE
-        lines.append(line.format(**asdict(entry)))
-    joined_lines = '\n'.join(lines)
-    page_contents = WIKI_TABLE.format(joined_lines)
-
-    with open(f"{OUT_DIR}/top_100_round_{round_number_of_round_id(LAST_ROUND)}.txt", 'w') as f:
-        f.write(page_contents)
-    print(page_contents)
+    parser = argparse.ArgumentParser(description='Generate the Top 100 wiki tables of rounds.')
+    parser.add_argument('rounds', type=int, nargs='*', help='Round ids, by default the last round')
+    parser.add_argument('--all', action='store_true', help='All rounds')
+    parser.add_argument('--quiet', action='store_true', help="Don't print the tables")
+    args = parser.parse_args()
+
+    pages = write_top_hundreds(ALL_ROUNDS if args.all else args.rounds or [LAST_ROUND])
+    if not args.quiet:
+        sys.stdout.write(''.join(page + '\n' for page in pages.values()))
+    print(f'{len(pages)} Top 100 pages written to {OUT_DIR}')
 
 
 if __name__ == '__main__':